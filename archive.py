@@ -0,0 +1,175 @@
+"""
+Hot/cold tiering for progress and mental health rows.
+
+Rows older than a horizon are moved out of fitness_tracker.db into per-user,
+per-month Parquet files:
+
+    archive/<table>/<username>/<YYYY-MM>.parquet
+
+and read back with memory-mapped columnar reads, so history queries can merge
+the archive with SQLite. Run the tiering job periodically:
+
+    python archive.py --horizon-days 365 --vacuum
+"""
+import argparse
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+import pandas as pd
+
+import shards
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+DB_PATH = "fitness_tracker.db"
+ARCHIVE_DIR = os.environ.get("FITNESS_ARCHIVE_DIR", "archive")
+DEFAULT_HORIZON_DAYS = 365
+
+# Table -> (date column, value columns)
+TABLES = {
+    'progress': ('date', ['steps', 'calories_burnt', 'calorie_intake',
+                          'water_intake', 'sleep_time']),
+    'mental_health_checks': ('check_date', ['mood_rating', 'notes']),
+}
+
+
+def _user_dir(table, username, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, table, quote(username, safe=''))
+
+
+def _write_month(path, df, date_col):
+    """Merge df into an existing month file (newer rows win) and replace it atomically."""
+    if os.path.exists(path):
+        existing = pq.read_table(path, memory_map=True).to_pandas()
+        df = pd.concat([existing, df]).drop_duplicates(subset=[date_col], keep='last')
+    df = df.sort_values(date_col)
+    tmp_path = path + ".tmp"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def archive_old_rows(db_path=DB_PATH, horizon_days=DEFAULT_HORIZON_DAYS,
+                     archive_dir=ARCHIVE_DIR, vacuum=False):
+    """
+    Move rows older than `horizon_days` into Parquet and delete them from SQLite.
+
+    Rows are moved one (username, month) batch at a time, each read, written
+    out and deleted inside its own short write transaction with the same
+    predicate, so a row written meanwhile is never deleted unarchived and the
+    app's writers only ever wait for one month file. Files are written before
+    the delete and month files are merged by date, so an interrupted run can
+    simply be repeated. Returns the number of rows moved per table.
+    """
+    if pq is None:
+        raise RuntimeError("pyarrow is required to archive rows")
+
+    cutoff_day = datetime.now() - timedelta(days=horizon_days)
+    cutoff = cutoff_day.strftime('%Y-%m-%d')
+    last_day = (cutoff_day - timedelta(days=1)).strftime('%Y-%m-%d')
+    moved = {}
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        for table, (date_col, columns) in TABLES.items():
+            batches = conn.execute(
+                f"SELECT DISTINCT username, substr({date_col}, 1, 7) FROM {table} "
+                f"WHERE {date_col} < ?", (cutoff,)).fetchall()
+            moved[table] = 0
+            for username, month in batches:
+                # The read and the delete share one predicate, so a backdated
+                # row written between batches is moved by the next run instead
+                where = f"WHERE username = ? AND {date_col} BETWEEN ? AND ?"
+                params = (username, f"{month}-01", min(f"{month}-31", last_day))
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    df = pd.read_sql_query(
+                        f"SELECT {date_col}, {', '.join(columns)} FROM {table} {where}",
+                        conn, params=params)
+                    if not df.empty:
+                        user_dir = _user_dir(table, username, archive_dir)
+                        os.makedirs(user_dir, exist_ok=True)
+                        _write_month(os.path.join(user_dir, f"{month}.parquet"), df, date_col)
+                        conn.execute(f"DELETE FROM {table} {where}", params)
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+                moved[table] += len(df)
+
+        if vacuum and any(moved.values()):
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return moved
+
+
+def read_archive(table, username, since=None, archive_dir=ARCHIVE_DIR):
+    """
+    Return archived rows for one user as a DataFrame sorted by date.
+
+    `since` is an optional YYYY-MM-DD lower bound; month files entirely before
+    it are skipped without being opened.
+    """
+    date_col, columns = TABLES[table]
+    empty = pd.DataFrame(columns=[date_col] + columns)
+    user_dir = _user_dir(table, username, archive_dir)
+    if not os.path.isdir(user_dir):
+        return empty
+    if pq is None:
+        raise RuntimeError("pyarrow is required to read archived rows")
+
+    since_month = since[:7] if since else None
+    frames = []
+    for name in sorted(os.listdir(user_dir)):
+        if not name.endswith(".parquet"):
+            continue
+        if since_month and name[:7] < since_month:
+            continue
+        frames.append(pq.read_table(os.path.join(user_dir, name), memory_map=True).to_pandas())
+    if not frames:
+        return empty
+
+    df = pd.concat(frames, ignore_index=True)
+    if since:
+        df = df[df[date_col] >= since]
+    return df.sort_values(date_col).reset_index(drop=True)
+
+
+def merge_with_archive(table, username, hot_df, since=None, archive_dir=ARCHIVE_DIR):
+    """
+    Combine rows read from SQLite with archived rows for the same user.
+
+    `hot_df` must use the archive column names. If a date somehow exists in
+    both tiers the SQLite row wins.
+    """
+    date_col, _ = TABLES[table]
+    cold_df = read_archive(table, username, since, archive_dir)
+    if cold_df.empty:
+        return hot_df
+    merged = pd.concat([cold_df, hot_df[cold_df.columns]], ignore_index=True)
+    merged = merged.drop_duplicates(subset=[date_col], keep='last')
+    return merged.sort_values(date_col).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old rows into Parquet archives")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--horizon-days", type=int, default=DEFAULT_HORIZON_DAYS)
+    parser.add_argument("--vacuum", action="store_true",
+                        help="reclaim space in the SQLite file afterwards")
+    args = parser.parse_args()
+
+    for path in shards.shard_paths(db_path=args.db):
+        moved = archive_old_rows(path, args.horizon_days, args.archive_dir, args.vacuum)
+        for table, count in moved.items():
+            print(f"{path} {table}: archived {count} rows")
+
+
+if __name__ == "__main__":
+    main()
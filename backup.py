@@ -0,0 +1,346 @@
+"""
+Online backups of the SQLite databases.
+
+Snapshots are taken with SQLite's online backup API a few pages at a time,
+sleeping between steps so app writers are not starved, then gzip-compressed
+into the backup directory. The Parquet archive (see archive.py) holds rows
+that are no longer in SQLite, so it is snapshotted alongside as a tarball.
+Old snapshots are pruned per database.
+
+    python backup.py backup --keep 14               # one run
+    python backup.py backup --interval 3600          # hourly snapshots
+    python backup.py verify backups/fitness_tracker-20261019-120000-000000.db.gz
+    python backup.py restore backups/fitness_tracker-20261019-120000-000000.db.gz fitness_tracker.db
+    python backup.py restore backups/archive-20261019-120000-000000.tar.gz archive
+"""
+import argparse
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import tarfile
+import tempfile
+import time
+from datetime import datetime
+
+import shards
+from archive import ARCHIVE_DIR
+
+DATABASES = list(dict.fromkeys(["fitness_tracker.db", "users.db"] + shards.shard_paths()))
+BACKUP_DIR = os.environ.get("FITNESS_BACKUP_DIR", "backups")
+ARCHIVE_SUFFIX = ".tar.gz"
+DB_SUFFIX = ".db.gz"
+
+
+def _online_copy(source, target, pages_per_step, sleep):
+    """Copy source into target with the backup API; returns (pages copied, seconds)."""
+    total = [0]
+
+    def progress(status, remaining, pages):
+        total[0] = pages
+        # The source is unlocked between steps; pausing here lets writers in
+        if remaining:
+            time.sleep(sleep)
+
+    started = time.perf_counter()
+    source.backup(target, pages=pages_per_step, progress=progress, sleep=sleep)
+    return total[0], time.perf_counter() - started
+
+
+def _snapshot_path(backup_dir, name, suffix):
+    """A new <name>-<timestamp><suffix> path; the microseconds keep back-to-back runs apart."""
+    while True:
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        output = os.path.join(backup_dir, f"{name}-{stamp}{suffix}")
+        if not os.path.exists(output):
+            return output
+        time.sleep(0.001)
+
+
+def backup_database(db_path, backup_dir=BACKUP_DIR, pages_per_step=64, sleep=0.01):
+    """
+    Snapshot one database into `backup_dir` as <name>-<timestamp>.db.gz.
+
+    Returns a report with the output path, duration, pages and pages/sec.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    output = _snapshot_path(backup_dir, name, DB_SUFFIX)
+
+    started = time.perf_counter()
+    fd, snapshot = tempfile.mkstemp(suffix=".db", dir=backup_dir)
+    os.close(fd)
+    try:
+        source = sqlite3.connect(db_path)
+        target = sqlite3.connect(snapshot)
+        try:
+            pages, copy_seconds = _online_copy(source, target, pages_per_step, sleep)
+        finally:
+            target.close()
+            source.close()
+
+        with open(snapshot, "rb") as raw, gzip.open(output + ".tmp", "wb") as compressed:
+            shutil.copyfileobj(raw, compressed)
+        os.replace(output + ".tmp", output)
+    finally:
+        os.remove(snapshot)
+
+    duration = time.perf_counter() - started
+    return {
+        'database': db_path,
+        'output': output,
+        'pages': pages,
+        'seconds': round(duration, 3),
+        'copy_seconds': round(copy_seconds, 3),
+        'pages_per_sec': round(pages / copy_seconds, 1) if copy_seconds else None,
+        'compressed_bytes': os.path.getsize(output),
+    }
+
+
+def backup_archive(archive_dir=ARCHIVE_DIR, backup_dir=BACKUP_DIR):
+    """
+    Snapshot the Parquet archive into `backup_dir` as archive-<timestamp>.tar.gz.
+
+    Month files are only ever replaced whole (see archive._write_month), so
+    each file in the tarball is a complete version of it.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    output = _snapshot_path(backup_dir, os.path.basename(os.path.normpath(archive_dir)),
+                            ARCHIVE_SUFFIX)
+    started = time.perf_counter()
+    files = 0
+    with tarfile.open(output + ".tmp", "w:gz") as tar:
+        for root, _, names in os.walk(archive_dir):
+            for name in sorted(names):
+                if name.endswith(".parquet"):
+                    path = os.path.join(root, name)
+                    tar.add(path, arcname=os.path.relpath(path, archive_dir))
+                    files += 1
+    os.replace(output + ".tmp", output)
+    return {
+        'database': archive_dir,
+        'output': output,
+        'files': files,
+        'seconds': round(time.perf_counter() - started, 3),
+        'compressed_bytes': os.path.getsize(output),
+    }
+
+
+def prune_backups(db_path, keep, backup_dir=BACKUP_DIR, suffix=DB_SUFFIX):
+    """Delete all but the newest `keep` snapshots of one database. Returns deleted paths."""
+    name = os.path.splitext(os.path.basename(os.path.normpath(db_path)))[0]
+    snapshots = sorted(glob.glob(os.path.join(backup_dir, f"{name}-*{suffix}")))
+    stale = snapshots[:-keep] if keep > 0 else []
+    for path in stale:
+        os.remove(path)
+    return stale
+
+
+def _decompress(snapshot_path):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    with os.fdopen(fd, "wb") as raw, gzip.open(snapshot_path, "rb") as compressed:
+        shutil.copyfileobj(compressed, raw)
+    return path
+
+
+def verify_archive_snapshot(snapshot_path):
+    """
+    Read every member of an archive tarball back. Returns (ok, messages, files).
+    """
+    messages, files = [], []
+    try:
+        with tarfile.open(snapshot_path, "r:gz") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                tar.extractfile(member).read()
+                files.append(member.name)
+    except (tarfile.TarError, OSError, EOFError) as e:
+        messages.append(str(e))
+    return not messages, messages or ["ok"], files
+
+
+def verify_snapshot(snapshot_path):
+    """
+    Run PRAGMA integrity_check on a compressed snapshot.
+
+    Returns (ok, messages, tables).
+    """
+    if snapshot_path.endswith(ARCHIVE_SUFFIX):
+        return verify_archive_snapshot(snapshot_path)
+    path = _decompress(snapshot_path)
+    try:
+        conn = sqlite3.connect(path)
+        try:
+            messages = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+            tables = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")]
+        finally:
+            conn.close()
+    finally:
+        os.remove(path)
+    return messages == ["ok"], messages, tables
+
+
+def restore_snapshot(snapshot_path, db_path, pages_per_step=64, sleep=0.01):
+    """
+    Verify a snapshot, then copy it over `db_path` with the online backup API.
+
+    Going through SQLite rather than replacing the file means open
+    connections see a consistent database afterwards. Raises ValueError if
+    the snapshot fails its integrity check.
+    """
+    ok, messages, _ = verify_snapshot(snapshot_path)
+    if not ok:
+        raise ValueError(f"Snapshot failed integrity check: {messages[:5]}")
+
+    path = _decompress(snapshot_path)
+    try:
+        source = sqlite3.connect(path)
+        target = sqlite3.connect(db_path)
+        try:
+            pages, seconds = _online_copy(source, target, pages_per_step, sleep)
+        finally:
+            target.close()
+            source.close()
+    finally:
+        os.remove(path)
+    return {
+        'database': db_path,
+        'snapshot': snapshot_path,
+        'pages': pages,
+        'seconds': round(seconds, 3),
+        'pages_per_sec': round(pages / seconds, 1) if seconds else None,
+    }
+
+
+def restore_archive_snapshot(snapshot_path, archive_dir=ARCHIVE_DIR):
+    """
+    Verify an archive tarball and extract it over `archive_dir`.
+
+    Files in the snapshot replace their current versions; month files added
+    since are left alone. Raises ValueError if the tarball is unreadable.
+    """
+    ok, messages, files = verify_archive_snapshot(snapshot_path)
+    if not ok:
+        raise ValueError(f"Snapshot failed integrity check: {messages[:5]}")
+    started = time.perf_counter()
+    root = os.path.realpath(archive_dir)
+    with tarfile.open(snapshot_path, "r:gz") as tar:
+        for member in tar:
+            target = os.path.realpath(os.path.join(root, member.name))
+            if not member.isfile() or not target.startswith(root + os.sep):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with tar.extractfile(member) as src, open(target + ".tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(target + ".tmp", target)
+    return {
+        'database': archive_dir,
+        'snapshot': snapshot_path,
+        'files': len(files),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def run_backups(databases, backup_dir, keep, pages_per_step, sleep, archive_dir=ARCHIVE_DIR):
+    """
+    Snapshot every database and the Parquet archive. A failure is reported
+    and the rest carry on; returns the number of failures.
+    """
+    failures = 0
+    for db_path in databases:
+        if not os.path.exists(db_path):
+            print(f"{db_path}: not found, skipped")
+            continue
+        try:
+            report = backup_database(db_path, backup_dir, pages_per_step, sleep)
+            pruned = prune_backups(db_path, keep, backup_dir)
+        except Exception as e:
+            print(f"{db_path}: backup failed: {e}", file=sys.stderr)
+            failures += 1
+            continue
+        print(f"{db_path}: {report['pages']} pages in {report['seconds']}s "
+              f"({report['pages_per_sec']} pages/sec) -> {report['output']} "
+              f"[{report['compressed_bytes']} bytes], pruned {len(pruned)}")
+
+    if archive_dir and os.path.isdir(archive_dir):
+        try:
+            report = backup_archive(archive_dir, backup_dir)
+            pruned = prune_backups(archive_dir, keep, backup_dir, ARCHIVE_SUFFIX)
+        except Exception as e:
+            print(f"{archive_dir}: backup failed: {e}", file=sys.stderr)
+            failures += 1
+        else:
+            print(f"{archive_dir}: {report['files']} files in {report['seconds']}s "
+                  f"-> {report['output']} [{report['compressed_bytes']} bytes], "
+                  f"pruned {len(pruned)}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up, verify and restore the databases")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backup = commands.add_parser("backup", help="take compressed snapshots")
+    backup.add_argument("databases", nargs="*", default=DATABASES)
+    backup.add_argument("--backup-dir", default=BACKUP_DIR)
+    backup.add_argument("--archive-dir", default=ARCHIVE_DIR,
+                        help="Parquet archive to snapshot too; '' to skip")
+    backup.add_argument("--keep", type=int, default=14, help="snapshots to keep per database")
+    backup.add_argument("--pages-per-step", type=int, default=64)
+    backup.add_argument("--sleep", type=float, default=0.01,
+                        help="seconds to pause between steps so writers can proceed")
+    backup.add_argument("--interval", type=int, default=0,
+                        help="seconds between scheduled runs; 0 runs once")
+
+    verify = commands.add_parser("verify", help="integrity-check a snapshot")
+    verify.add_argument("snapshot")
+
+    restore = commands.add_parser("restore", help="verify a snapshot and restore it")
+    restore.add_argument("snapshot")
+    restore.add_argument("database", help="database file, or archive directory for a .tar.gz")
+
+    args = parser.parse_args()
+
+    if args.command == "backup":
+        while True:
+            try:
+                failures = run_backups(args.databases, args.backup_dir, args.keep,
+                                       args.pages_per_step, args.sleep, args.archive_dir)
+            except Exception as e:
+                print(f"Backup run failed: {e}", file=sys.stderr)
+                failures = 1
+            if not args.interval:
+                sys.exit(1 if failures else 0)
+            # A scheduled run keeps going; the next interval retries
+            time.sleep(args.interval)
+    elif args.command == "verify":
+        ok, messages, tables = verify_snapshot(args.snapshot)
+        kind = "files" if args.snapshot.endswith(ARCHIVE_SUFFIX) else "tables"
+        print(f"{args.snapshot}: {'ok' if ok else 'FAILED'} ({len(tables)} {kind}: "
+              f"{', '.join(tables)})")
+        if not ok:
+            print("\n".join(messages))
+            sys.exit(1)
+    else:
+        try:
+            if args.snapshot.endswith(ARCHIVE_SUFFIX):
+                report = restore_archive_snapshot(args.snapshot, args.database)
+            else:
+                report = restore_snapshot(args.snapshot, args.database)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        if 'files' in report:
+            print(f"Restored {report['files']} files into {report['database']} "
+                  f"in {report['seconds']}s")
+        else:
+            print(f"Restored {report['pages']} pages into {report['database']} "
+                  f"in {report['seconds']}s ({report['pages_per_sec']} pages/sec)")
+
+
+if __name__ == "__main__":
+    main()
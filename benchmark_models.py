@@ -0,0 +1,301 @@
+"""
+Latency and memory benchmarks for the physical review models.
+
+Each model is benchmarked in its own interpreter so load time and RSS are
+not skewed by the others. Inputs are random rows drawn from the same
+feature layouts and input ranges as physical_review() in login.py.
+
+    python benchmark_models.py --save model_baseline.json
+    python benchmark_models.py --compare model_baseline.json --threshold 0.25
+
+--compare exits non-zero if any model regressed past the threshold, so a
+swapped-in .pkl can be gated before it ships. Each model is run in several
+fresh interpreters (--trials) and the best value of each metric is kept,
+since the best run is the least disturbed by scheduler and cache noise.
+Changes count only past MIN_TIME_CHANGE_MS and a multiple of the baseline's
+own trial spread, so sub-millisecond models are still gated.
+
+    python -m pytest test_benchmark_models.py
+"""
+import argparse
+import gc
+import json
+import os
+import pickle
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+MODELS_DIR = "."
+
+# Feature order per model, as built in physical_review()
+FEATURES = {
+    'breaths_per_minute': (5, 40),
+    'breath_shortness_severity': (0, 10),
+    'cough_frequency': (0, 10),
+    'cough_severity': (0, 10),
+    'oxygen_saturation': (80, 100),
+    'heart_rate': (50, 200),
+    'blood_pressure_sys': (80, 200),
+    'blood_pressure_dia': (50, 120),
+    'cholesterol': (100, 300),
+}
+
+MODEL_LAYOUTS = {
+    'CHD': ['blood_pressure_sys', 'blood_pressure_dia', 'heart_rate', 'cholesterol'],
+    'hypoxemia': ['oxygen_saturation'],
+    'bronchi': ['breaths_per_minute', 'breath_shortness_severity',
+                'cough_frequency', 'cough_severity'],
+    'asthma': ['oxygen_saturation', 'heart_rate', 'breaths_per_minute'],
+}
+
+BATCH_SIZES = (1, 8, 64, 512, 4096)
+
+# Single-row calls are timed in blocks of this many, to amortize timer overhead
+SINGLE_BLOCK = 10
+
+# Metric -> True if a larger value is a regression. Per-call percentiles are
+# reported but not gated: on a shared host they move with every neighbour,
+# while the best block average only moves when the model does.
+REGRESSION_DIRECTION = {
+    'load_seconds': True,
+    'single_ms': True,
+    'rss_delta_mb': True,
+    'model_alloc_mb': True,
+    'throughput_rows_per_sec': False,
+}
+
+# Memory readings are page-granular, so ignore changes smaller than this (MB)
+MIN_MEMORY_CHANGE_MB = 1.0
+
+# Timing changes smaller than this (ms) are ignored
+MIN_TIME_CHANGE_MS = 0.05
+
+# Any change must also exceed this many times the baseline's spread: the gap
+# between its best and second-best trial, i.e. how reproducible the best is
+SPREAD_FACTOR = 3.0
+
+
+def _rss_mb():
+    """Resident set size of this process in MB (Linux /proc, else peak RSS)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def make_inputs(name, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.integers(*FEATURES[f], endpoint=True, size=rows)
+                            for f in MODEL_LAYOUTS[name]])
+
+
+def _percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 4)
+
+
+def benchmark_model(name, models_dir=MODELS_DIR, repeats=200, load_repeats=20):
+    """Benchmark one model in the current process and return a result dict."""
+    path = os.path.join(models_dir, f"{name}.pkl")
+
+    # Warm imports (sklearn etc.) so they are not charged to the model
+    with open(path, "rb") as f:
+        pickle.load(f)
+    gc.collect()
+
+    rss_before = _rss_mb()
+    tracemalloc.start()
+    with open(path, "rb") as f:
+        model = pickle.load(f)
+    model_alloc, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    rss_delta = _rss_mb() - rss_before
+
+    # Timed separately, since tracemalloc slows every allocation down
+    load_times = []
+    for _ in range(load_repeats):
+        started = time.perf_counter()
+        with open(path, "rb") as f:
+            pickle.load(f)
+        load_times.append(time.perf_counter() - started)
+
+    single = make_inputs(name, 1)
+    model.predict(single)
+    single_times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        model.predict(single)
+        single_times.append(time.perf_counter() - started)
+    block_times = []
+    for _ in range(max(1, repeats // SINGLE_BLOCK)):
+        started = time.perf_counter()
+        for _ in range(SINGLE_BLOCK):
+            model.predict(single)
+        block_times.append((time.perf_counter() - started) / SINGLE_BLOCK)
+
+    batches = {}
+    for size in BATCH_SIZES:
+        batch = make_inputs(name, size, seed=size)
+        runs = max(10, repeats // max(1, size // 8))
+        times = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            model.predict(batch)
+            times.append(time.perf_counter() - started)
+        median = float(np.median(times))
+        # Throughput from the fastest run, which is the least disturbed by noise
+        fastest = min(times)
+        batches[str(size)] = {
+            'p50_ms': round(median * 1000, 4),
+            'rows_per_sec': round(size / fastest, 1) if fastest else None,
+        }
+
+    return {
+        'model': name,
+        'type': type(model).__name__,
+        'file_bytes': os.path.getsize(path),
+        'load_seconds': round(min(load_times), 6),
+        'single_ms': round(min(block_times) * 1000, 4),
+        'single_p50_ms': _percentile_ms(single_times, 50),
+        'single_p95_ms': _percentile_ms(single_times, 95),
+        'single_p99_ms': _percentile_ms(single_times, 99),
+        'batches': batches,
+        'throughput_rows_per_sec': max(b['rows_per_sec'] or 0 for b in batches.values()),
+        'rss_delta_mb': round(max(rss_delta, 0.0), 3),
+        'model_alloc_mb': round(model_alloc / 2 ** 20, 3),
+    }
+
+
+def run_isolated(name, models_dir, repeats):
+    """Benchmark a model in a fresh interpreter so RSS reflects that model alone."""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", name,
+         "--models-dir", models_dir, "--repeats", str(repeats)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def best_of(trials):
+    """Combine trial results for one model, keeping the best value of each metric."""
+    best = dict(trials[0])
+    for metric, higher_is_worse in REGRESSION_DIRECTION.items():
+        values = [t[metric] for t in trials if t.get(metric) is not None]
+        if values:
+            best[metric] = min(values) if higher_is_worse else max(values)
+    for metric in ('single_p50_ms', 'single_p95_ms', 'single_p99_ms'):
+        best[metric] = min(t[metric] for t in trials)
+    best['trials'] = len(trials)
+    best['spread'] = {}
+    for metric, higher_is_worse in REGRESSION_DIRECTION.items():
+        values = sorted((t[metric] for t in trials if t.get(metric) is not None),
+                        reverse=not higher_is_worse)
+        if len(values) > 1:
+            best['spread'][metric] = abs(values[1] - values[0])
+    return best
+
+
+def _to_ms(metric, value):
+    """A timing metric in milliseconds, or None for non-timing metrics."""
+    if metric == 'load_seconds':
+        return value * 1000
+    if metric.endswith('_ms'):
+        return value
+    if metric == 'throughput_rows_per_sec':
+        # Time to push the largest batch through at this rate
+        return BATCH_SIZES[-1] / value * 1000 if value else None
+    return None
+
+
+def is_noise(metric, base, old, new):
+    """True if old -> new is within the absolute floors or the baseline's spread."""
+    if metric.endswith('_mb') and abs(new - old) < MIN_MEMORY_CHANGE_MB:
+        return True
+    old_ms, new_ms = _to_ms(metric, old), _to_ms(metric, new)
+    if old_ms is not None and new_ms is not None and abs(new_ms - old_ms) < MIN_TIME_CHANGE_MS:
+        return True
+    return abs(new - old) < SPREAD_FACTOR * base.get('spread', {}).get(metric, 0.0)
+
+
+def compare(results, baseline, threshold):
+    """Return regression messages for metrics worse than baseline by more than `threshold`."""
+    failures = []
+    for name, result in results.items():
+        base = baseline.get('models', {}).get(name)
+        if base is None:
+            continue
+        for metric, higher_is_worse in REGRESSION_DIRECTION.items():
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            if is_noise(metric, base, old, new):
+                continue
+            change = (new - old) / old if higher_is_worse else (old - new) / old
+            if change > threshold:
+                failures.append(f"{name}.{metric}: {old} -> {new} ({change:+.0%} worse)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the physical review models")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--models", nargs="*", default=list(MODEL_LAYOUTS))
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--trials", type=int, default=5,
+                        help="fresh-interpreter runs per model; the best of each metric is kept")
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to check against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed relative regression before --compare fails")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        import warnings
+        warnings.simplefilter("ignore")
+        print(json.dumps(benchmark_model(args.worker, args.models_dir, args.repeats)))
+        return
+
+    # Round-robin over models so each model's trials are spread across the
+    # whole run, rather than all landing in the same noisy stretch
+    trials = {name: [] for name in args.models}
+    for _ in range(max(1, args.trials)):
+        for name in args.models:
+            trials[name].append(run_isolated(name, args.models_dir, args.repeats))
+    results = {name: best_of(runs) for name, runs in trials.items()}
+    for name, r in results.items():
+        print(f"{name:10s} {r['type']:22s} load {r['load_seconds'] * 1000:8.2f} ms  "
+              f"single {r['single_ms']:7.3f} ms  p50 {r['single_p50_ms']:7.3f} ms  p95 {r['single_p95_ms']:7.3f} ms  "
+              f"max {r['throughput_rows_per_sec']:>12,.0f} rows/s  "
+              f"RSS +{r['rss_delta_mb']:.1f} MB")
+
+    if args.save:
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'models': results,
+        }
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        failures = compare(results, baseline, args.threshold)
+        for line in failures:
+            print(f"REGRESSION {line}")
+        if failures:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
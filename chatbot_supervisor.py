@@ -0,0 +1,244 @@
+"""
+Process supervisor for the mental health chatbot.
+
+Keeps a bounded pool of warm chatbot processes instead of spawning a new
+interpreter on every button click. Running instances are reused, dead ones
+are reaped and replaced, and startup latency and live process count are
+exposed through stats().
+"""
+import atexit
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+DEFAULT_CHATBOT_PATH = r"C:\Users\varsh\Downloads\night\app.py"
+
+
+def get_chatbot_path():
+    """Chatbot script path, overridable with the CHATBOT_PATH environment variable."""
+    return os.environ.get("CHATBOT_PATH", DEFAULT_CHATBOT_PATH)
+
+
+class ChatbotSupervisor:
+    """
+    Start, reuse, health-check and reap chatbot processes.
+
+    If health_port is set, a process only counts as healthy once it accepts
+    TCP connections on that port, and startup latency is measured up to that
+    point. Otherwise a process is healthy while it is running. A port can't
+    tell pooled processes apart, so health_port requires pool_size=1.
+    """
+
+    def __init__(self, chatbot_path=None, pool_size=1, python_executable=None,
+                 health_port=None, startup_timeout=30.0):
+        if health_port is not None and pool_size > 1:
+            raise ValueError("health_port can only check a single process; use pool_size=1")
+        self.chatbot_path = chatbot_path or get_chatbot_path()
+        self.pool_size = max(1, pool_size)
+        self.python_executable = python_executable or sys.executable
+        self.health_port = health_port
+        self.startup_timeout = startup_timeout
+
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._processes = []
+        self._next = 0
+        self._starts = 0
+        self._restarts = 0
+        self._reaped = 0
+        self._pending_crashes = 0
+        self._startup_latencies = []
+        self._last_error = None
+        self._monitor = None
+        self._stopping = threading.Event()
+        atexit.register(self.shutdown)
+
+    def acquire(self):
+        """
+        Return a healthy chatbot process, starting one only if none is running.
+
+        Raises FileNotFoundError if the chatbot script does not exist.
+        """
+        proc = self._pick_healthy()
+        if proc is not None:
+            return proc
+        # Only one launch at a time; state reads stay available meanwhile
+        with self._start_lock:
+            proc = self._pick_healthy()
+            if proc is not None:
+                return proc
+            return self._start()
+
+    def warm(self):
+        """Fill the pool up to pool_size."""
+        with self._start_lock:
+            while True:
+                with self._lock:
+                    self._reap()
+                    if len(self._processes) >= self.pool_size:
+                        return
+                self._start()
+
+    def health_check(self):
+        """
+        Reap exited processes and restart any that crashed or stopped responding.
+
+        Processes that exited cleanly (e.g. the user closed the chatbot) are
+        reaped but not relaunched; the next acquire() starts one on demand.
+        """
+        with self._start_lock:
+            with self._lock:
+                self._reap()
+                # Crashes reaped earlier by stats() or acquire() count too
+                lost, self._pending_crashes = self._pending_crashes, 0
+                unhealthy = [p for p in self._processes if not self._is_healthy(p)]
+                for proc in unhealthy:
+                    self._processes.remove(proc)
+                # acquire() may already have replaced a crashed process
+                missing = min(lost + len(unhealthy), self.pool_size - len(self._processes))
+            for proc in unhealthy:
+                self._stop(proc)
+            for _ in range(missing):
+                self._start()
+                with self._lock:
+                    self._restarts += 1
+
+    def start_monitor(self, interval=10.0):
+        """Run health_check() every `interval` seconds on a daemon thread."""
+        if self._monitor and self._monitor.is_alive():
+            return
+
+        def run():
+            while not self._stopping.wait(interval):
+                try:
+                    self.health_check()
+                except Exception as e:
+                    # Keep monitoring; the next round retries the restart
+                    with self._lock:
+                        self._last_error = f"{type(e).__name__}: {e}"
+
+        self._monitor = threading.Thread(target=run, name="chatbot-monitor", daemon=True)
+        self._monitor.start()
+
+    def stats(self):
+        with self._lock:
+            self._reap()
+            latencies = self._startup_latencies
+            return {
+                'live_processes': len(self._processes),
+                'pool_size': self.pool_size,
+                'starts': self._starts,
+                'restarts': self._restarts,
+                'reaped': self._reaped,
+                'last_startup_seconds': round(latencies[-1], 3) if latencies else None,
+                'avg_startup_seconds': (round(sum(latencies) / len(latencies), 3)
+                                        if latencies else None),
+                'last_error': self._last_error,
+                'pids': [p.pid for p in self._processes],
+            }
+
+    def shutdown(self):
+        self._stopping.set()
+        with self._lock:
+            processes, self._processes = self._processes, []
+        for proc in processes:
+            self._stop(proc)
+
+    def _pick_healthy(self):
+        with self._lock:
+            self._reap()
+            healthy = [p for p in self._processes if self._is_healthy(p)]
+            if not healthy:
+                return None
+            self._next = (self._next + 1) % len(healthy)
+            return healthy[self._next]
+
+    def _start(self):
+        """Launch one process and add it to the pool. Caller holds _start_lock, not _lock."""
+        with self._lock:
+            recycled = None
+            if len(self._processes) >= self.pool_size:
+                # Pool is full of unhealthy processes; recycle the oldest
+                recycled = self._processes.pop(0)
+                self._restarts += 1
+        if recycled is not None:
+            self._stop(recycled)
+        if not os.path.exists(self.chatbot_path):
+            raise FileNotFoundError(f"Chatbot file not found: {self.chatbot_path}")
+
+        started = time.perf_counter()
+        proc = subprocess.Popen([self.python_executable, self.chatbot_path])
+        try:
+            if self.health_port is not None:
+                self._wait_for_port(proc)
+        except BaseException:
+            # Never leave a half-started child outside the pool
+            self._stop(proc)
+            raise
+        with self._lock:
+            if self._stopping.is_set():
+                self._stop(proc)
+                raise RuntimeError("Supervisor is shutting down")
+            self._startup_latencies.append(time.perf_counter() - started)
+            del self._startup_latencies[:-100]
+            self._starts += 1
+            self._processes.append(proc)
+        return proc
+
+    def _wait_for_port(self, proc):
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"Chatbot exited during startup (code {proc.returncode})")
+            if self._port_open():
+                return
+            time.sleep(0.1)
+        raise TimeoutError(f"Chatbot did not open port {self.health_port} "
+                           f"within {self.startup_timeout}s")
+
+    def _port_open(self):
+        try:
+            with socket.create_connection(("127.0.0.1", self.health_port), timeout=0.5):
+                return True
+        except OSError:
+            return False
+
+    def _is_healthy(self, proc):
+        if proc.poll() is not None:
+            return False
+        return self.health_port is None or self._port_open()
+
+    def _reap(self):
+        """Drop exited processes, adding abnormal exits to the crashes health_check() restarts."""
+        # poll() collects the exit status, so finished children don't linger as zombies
+        alive = [p for p in self._processes if p.poll() is None]
+        self._pending_crashes += sum(1 for p in self._processes
+                                     if p.returncode not in (None, 0))
+        self._reaped += len(self._processes) - len(alive)
+        self._processes = alive
+
+    @staticmethod
+    def _stop(proc, timeout=5.0):
+        if proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+def create_supervisor():
+    """Build a supervisor from CHATBOT_PATH, CHATBOT_POOL_SIZE and CHATBOT_HEALTH_PORT."""
+    return ChatbotSupervisor(
+        pool_size=_env_int("CHATBOT_POOL_SIZE") or 1,
+        health_port=_env_int("CHATBOT_HEALTH_PORT"),
+    )
@@ -0,0 +1,265 @@
+"""
+Cross-user cohort percentiles and leaderboards.
+
+A periodic job scans one day's and one week's progress rows on every shard, builds a
+mergeable KLL-style quantile sketch and a top-K leaderboard per metric, and
+stores them in cohort_sketches / leaderboards. Page views then read a single
+precomputed row instead of aggregating progress across all users:
+
+    python cohort_stats.py --interval 300
+"""
+import argparse
+import bisect
+import heapq
+import json
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import shards
+from streaks import METRICS
+
+DB_PATH = "fitness_tracker.db"
+LEADERBOARD_SIZE = 10
+
+
+class QuantileSketch:
+    """
+    Compact KLL-style quantile sketch.
+
+    Items are kept in levels of compactors; an item at level h stands for
+    2**h inputs. When the sketch outgrows its capacity the fullest level is
+    sorted and every other item (from a random offset) is promoted, so memory
+    stays O(k log n) with rank error around 1/k. Sketches built on separate
+    slices of the data can be merged.
+    """
+
+    def __init__(self, k=200):
+        self.k = k
+        self.count = 0
+        self.levels = [[]]
+
+    def update(self, value):
+        self.levels[0].append(float(value))
+        self.count += 1
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self._compress()
+
+    def _capacity(self, level):
+        # Lower levels get smaller compactors, as in KLL
+        depth = len(self.levels) - level - 1
+        return max(2, int(self.k * (2 / 3) ** depth))
+
+    def _compress(self):
+        for level, items in enumerate(self.levels):
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items.sort()
+                # Pairs only: an odd item out stays behind so no weight is lost or doubled
+                even = len(items) - len(items) % 2
+                offset = random.randint(0, 1)
+                self.levels[level + 1].extend(items[offset:even:2])
+                self.levels[level] = items[even:]
+                return self._compress()
+
+    def cdf(self):
+        """Sorted (value, cumulative fraction) pairs for percentile lookups."""
+        weighted = sorted((value, 2 ** level)
+                          for level, items in enumerate(self.levels) for value in items)
+        total = sum(weight for _, weight in weighted) or 1
+        points, running = [], 0
+        for value, weight in weighted:
+            running += weight
+            points.append((value, running / total))
+        return points
+
+    def to_json(self):
+        return json.dumps({'k': self.k, 'count': self.count, 'levels': self.levels})
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        sketch = cls(data['k'])
+        sketch.count = data['count']
+        sketch.levels = data['levels']
+        return sketch
+
+
+def _ensure_date_index(conn):
+    # Cohort scans filter progress by date across all users
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_progress_date ON progress (date)")
+
+
+def ensure_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cohort_sketches (
+            metric TEXT,
+            period TEXT,
+            users INTEGER,
+            sketch TEXT,
+            cdf TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (metric, period)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboards (
+            metric TEXT,
+            period TEXT,
+            rank INTEGER,
+            username TEXT,
+            value REAL,
+            PRIMARY KEY (metric, period, rank)
+        )
+    ''')
+
+
+def period_keys(date):
+    """Day and ISO-week period keys for a YYYY-MM-DD date."""
+    year, week, _ = datetime.strptime(date, '%Y-%m-%d').isocalendar()
+    return f"D:{date}", f"W:{year}-W{week:02d}"
+
+
+def _period_range(date):
+    day = datetime.strptime(date, '%Y-%m-%d')
+    monday = day - timedelta(days=day.weekday())
+    sunday = monday + timedelta(days=6)
+    day_key, week_key = period_keys(date)
+    return [(day_key, date, date),
+            (week_key, monday.strftime('%Y-%m-%d'), sunday.strftime('%Y-%m-%d'))]
+
+
+def build_period(conns, metric, start, end, k=200):
+    """
+    Sketch and top-K of each user's average `metric` between start and end.
+
+    Takes several connections so partial sketches from separate databases can
+    be merged into one.
+    """
+    sketch = QuantileSketch(k)
+    top = []
+    for conn in conns:
+        partial = QuantileSketch(k)
+        cursor = conn.execute(f"""
+            SELECT username, AVG({metric}) FROM progress
+            WHERE date BETWEEN ? AND ?
+            GROUP BY username
+        """, (start, end))
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for username, value in rows:
+                partial.update(value)
+                item = (value, username)
+                if len(top) < LEADERBOARD_SIZE:
+                    heapq.heappush(top, item)
+                else:
+                    heapq.heappushpop(top, item)
+        sketch.merge(partial)
+    return sketch, sorted(top, reverse=True)
+
+
+def refresh_cohorts(conn, date=None, source_conns=None):
+    """
+    Rebuild today's and this week's sketches and leaderboards for every metric.
+
+    Results are written to `conn`; progress is read from `source_conns`
+    (defaults to `conn` itself).
+    """
+    ensure_schema(conn)
+    date = date or datetime.now().strftime('%Y-%m-%d')
+    source_conns = source_conns or [conn]
+    for source in source_conns:
+        _ensure_date_index(source)
+    updated_at = datetime.now().isoformat(timespec='seconds')
+
+    for period, start, end in _period_range(date):
+        for metric in METRICS:
+            sketch, top = build_period(source_conns, metric, start, end)
+            # Thin the CDF to at most ~200 points so lookups stay a single small read
+            cdf = sketch.cdf()
+            step = max(1, len(cdf) // 200)
+            if cdf:
+                cdf = cdf[step - 1:-1:step] + [cdf[-1]]
+            with conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO cohort_sketches
+                    (metric, period, users, sketch, cdf, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (metric, period, sketch.count, sketch.to_json(), json.dumps(cdf),
+                      updated_at))
+                conn.execute("DELETE FROM leaderboards WHERE metric = ? AND period = ?",
+                             (metric, period))
+                conn.executemany("""
+                    INSERT INTO leaderboards (metric, period, rank, username, value)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [(metric, period, rank, username, value)
+                      for rank, (value, username) in enumerate(top, start=1)])
+
+
+def get_cdf(conn, metric, period):
+    """Stored (value, cumulative fraction) points for a period, or None if not computed yet."""
+    ensure_schema(conn)
+    row = conn.execute("SELECT cdf FROM cohort_sketches WHERE metric = ? AND period = ?",
+                       (metric, period)).fetchone()
+    return json.loads(row[0]) if row is not None else None
+
+
+def percentile_from_cdf(cdf, value):
+    """Share of users (0-100) at or below `value` on a stored CDF, or None if it is empty."""
+    if not cdf:
+        return None
+    values = [point[0] for point in cdf]
+    index = bisect.bisect_right(values, value)
+    return 100.0 * (cdf[index - 1][1] if index else 0.0)
+
+
+def get_percentile(conn, metric, period, value):
+    """
+    Share of users (0-100) with an average at or below `value`, or None if
+    the period has not been computed yet.
+    """
+    return percentile_from_cdf(get_cdf(conn, metric, period), value)
+
+
+def get_leaderboard(conn, metric, period):
+    ensure_schema(conn)
+    return conn.execute("""
+        SELECT rank, username, value FROM leaderboards
+        WHERE metric = ? AND period = ? ORDER BY rank
+    """, (metric, period)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh cohort percentiles and leaderboards")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--interval", type=int, default=0,
+                        help="seconds between refreshes; 0 runs once")
+    args = parser.parse_args()
+
+    while True:
+        started = time.perf_counter()
+        conn = sqlite3.connect(args.db)
+        sources = shards.all_connections(args.db)
+        refresh_cohorts(conn, source_conns=sources)
+        for source in sources:
+            source.close()
+        conn.close()
+        print(f"Refreshed cohorts in {time.perf_counter() - started:.2f}s")
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
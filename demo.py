@@ -1,5 +1,4 @@
 import streamlit as st
-import sqlite3
 import numpy as np
 import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
@@ -7,8 +6,14 @@ import pandas as pd
 import os
 import plotly.express as px
 import plotly.graph_objects as go
-import subprocess
-import sys
+import shards
+from field_bounds import GOAL_FIELDS, MOOD_RATING, PROGRESS_FIELDS, WEIGHT_GOALS
+from chatbot_supervisor import create_supervisor
+from archive import merge_with_archive
+from streaks import get_streaks, record_goal_change, record_progress
+from cohort_stats import get_cdf, get_leaderboard, percentile_from_cdf, period_keys
+from mood_analytics import get_user_correlations, rolling_frame
+from prefetch import PREFETCH_DAYS, SessionStore
 
 # Initialize session state variables
 def init_session_state():
@@ -25,8 +30,60 @@ def init_session_state():
 init_session_state()
 
 # Database functions
-def get_db():
-    return sqlite3.connect("fitness_tracker.db")
+def get_db(username=None):
+    """
+    Connection to the shard holding `username`'s rows, or to the main
+    database (users table) when no username is given.
+    """
+    return shards.connect(username)
+
+def get_session_store(username):
+    """The logged-in session's prefetched working set, if it belongs to `username`."""
+    store = st.session_state.get("user_store")
+    if store is not None and store.username == username:
+        return store
+    return None
+
+def start_prefetch(username):
+    """Load goals, recent history, streaks and cohort stats in the background right after login."""
+    st.session_state.user_store = SessionStore(username).start({
+        'goals': lambda: load_user_goals(username),
+        'progress': lambda: load_progress_history(username, PREFETCH_DAYS),
+        'mood': lambda: load_mood_history(username, PREFETCH_DAYS),
+        'streaks': lambda: load_streaks(username),
+        'cohort': load_cohort_stats,
+    })
+
+def invalidate_session_store(username, *keys):
+    store = get_session_store(username)
+    if store is not None:
+        store.invalidate(*keys)
+
+def _from_store(username, key, loader):
+    """A prefetched value, or `loader()` while the store reloads a missing key."""
+    store = get_session_store(username)
+    value = store.get(key) if store is not None else None
+    if value is None:
+        value = loader()
+        if store is not None and value is not None:
+            store.put(key, value)
+    return value
+
+def _recent_from_store(username, key, date_col, days, loader):
+    """
+    Last `days` days of a prefetched frame. Rows written from outside this
+    session show up within the store's TTL. Returns None if the range has to
+    come from the database, in which case only that range is read while the
+    store reloads the full frame in the background.
+    """
+    if days is None or days > PREFETCH_DAYS:
+        return None
+    store = get_session_store(username)
+    df = store.get(key) if store is not None else None
+    if df is None:
+        return None
+    date_limit = (datetime.now() - timedelta(days=days-1)).strftime('%Y-%m-%d')
+    return df[df[date_col] >= date_limit].reset_index(drop=True)
 
 def init_db():
     try:
@@ -87,33 +144,38 @@ def init_db():
     except Exception as e:
         st.error(f"Database initialization error: {e}")
 
+@st.cache_resource
+def get_chatbot_supervisor():
+    """One supervisor per Streamlit server, shared across sessions and reruns."""
+    supervisor = create_supervisor()
+    supervisor.start_monitor()
+    return supervisor
+
 def launch_mental_health_chatbot():
     """
-    Launch the mental health chatbot in a new process
+    Launch the mental health chatbot, reusing a running instance if there is one
     """
-    chatbot_path = r"C:\Users\varsh\Downloads\night\app.py"
-    if os.path.exists(chatbot_path):
-        try:
-            python_executable = sys.executable
-            subprocess.Popen([python_executable, chatbot_path])
-            return True
-        except Exception as e:
-            st.error(f"Error launching chatbot: {e}")
-            return False
-    else:
+    try:
+        get_chatbot_supervisor().acquire()
+        return True
+    except FileNotFoundError:
         st.error("Chatbot file not found at specified path")
         return False
+    except Exception as e:
+        st.error(f"Error launching chatbot: {e}")
+        return False
 
 def log_mental_health_check(username):
     """
     Log mental health check activity
     """
     st.subheader("Mental Health Check-in")
-    mood_rating = st.slider("How are you feeling today? (1-10)", 1, 10, 5)
+    _, low, high = MOOD_RATING
+    mood_rating = st.slider(f"How are you feeling today? ({low}-{high})", low, high, 5)
     notes = st.text_area("Any notes about your mental state today?")
     
     if st.button("Save Mental Health Check-in"):
-        conn = get_db()
+        conn = get_db(username)
         c = conn.cursor()
         today = datetime.now().strftime('%Y-%m-%d')
         try:
@@ -123,6 +185,7 @@ def log_mental_health_check(username):
                 VALUES (?, ?, ?, ?)
             """, (username, today, mood_rating, notes))
             conn.commit()
+            invalidate_session_store(username, 'mood')
             st.success("Mental health check-in logged successfully!")
         except Exception as e:
             st.error(f"Error logging mental health check: {e}")
@@ -131,7 +194,10 @@ def log_mental_health_check(username):
     # Add button to launch chatbot
     if st.button("Open Mental Health Chatbot"):
         if launch_mental_health_chatbot():
-            st.success("Chatbot launched in a new window!")
+            stats = get_chatbot_supervisor().stats()
+            st.success("Chatbot is running!")
+            st.caption(f"Live chatbot processes: {stats['live_processes']} · "
+                       f"last startup: {stats['last_startup_seconds']}s")
         else:
             st.error("Failed to launch chatbot. Please check the file path.")
 
@@ -139,21 +205,11 @@ def show_mental_health_history(username):
     """
     Display mental health history and trends
     """
-    conn = get_db()
-    c = conn.cursor()
+    history = get_mood_history(username)
     
-    c.execute("""
-        SELECT check_date, mood_rating, notes 
-        FROM mental_health_checks 
-        WHERE username = ?
-        ORDER BY check_date DESC
-    """, (username,))
-    
-    history = c.fetchall()
-    conn.close()
-    
-    if history:
-        df = pd.DataFrame(history, columns=['Date', 'Mood Rating', 'Notes'])
+    if not history.empty:
+        df = history.iloc[::-1].copy()
+        df.columns = ['Date', 'Mood Rating', 'Notes']
         
         # Show mood trend chart
         fig = px.line(df, x='Date', y='Mood Rating', 
@@ -189,14 +245,26 @@ def add_user(username, password):
         # Add user
         c.execute("INSERT INTO users (username, password) VALUES (?, ?)", 
                  (username, password))
-        
-        # Initialize goals
-        c.execute("""
-            INSERT INTO goals (username) VALUES (?)
-        """, (username,))
-        
         conn.commit()
         conn.close()
+        
+        # Initialize goals in the user's shard
+        try:
+            conn = get_db(username)
+            c = conn.cursor()
+            c.execute("""
+                INSERT OR IGNORE INTO goals (username) VALUES (?)
+            """, (username,))
+            
+            conn.commit()
+            conn.close()
+        except Exception:
+            # The shard is a separate file, so undo the user row by hand
+            conn = get_db()
+            conn.execute("DELETE FROM users WHERE username = ?", (username,))
+            conn.commit()
+            conn.close()
+            raise
         return True, "Account created successfully!"
     except Exception as e:
         return False, f"Error creating account: {e}"
@@ -224,7 +292,10 @@ def verify_user(username, password):
         return False, f"Login error: {e}"
 
 def get_user_goals(username):
-    conn = get_db()
+    return _from_store(username, 'goals', lambda: load_user_goals(username))
+
+def load_user_goals(username):
+    conn = get_db(username)
     c = conn.cursor()
     c.execute("SELECT * FROM goals WHERE username = ?", (username,))
     goals = c.fetchone()
@@ -242,8 +313,9 @@ def get_user_goals(username):
     return None
 
 def update_goals(username, goals_dict):
-    conn = get_db()
+    conn = get_db(username)
     c = conn.cursor()
+    record_goal_change(conn, username, goals_dict)
     c.execute("""
         UPDATE goals 
         SET steps = ?, calories_burnt = ?, calorie_intake = ?, 
@@ -256,9 +328,10 @@ def update_goals(username, goals_dict):
     ))
     conn.commit()
     conn.close()
+    invalidate_session_store(username, 'goals', 'streaks')
 
 def log_daily_progress(username, progress_dict):
-    conn = get_db()
+    conn = get_db(username)
     c = conn.cursor()
     
     # Check if entry exists for today
@@ -273,27 +346,104 @@ def log_daily_progress(username, progress_dict):
         progress_dict['calorie_intake'], progress_dict['water_intake'],
         progress_dict['sleep_time']
     ))
+    record_progress(conn, username, today, progress_dict)
     conn.commit()
     conn.close()
+    invalidate_session_store(username, 'progress', 'streaks')
 
-def get_progress_history(username, days=7):
+def get_user_streaks(username):
+    return _from_store(username, 'streaks', lambda: load_streaks(username))
+
+def load_streaks(username):
+    conn = get_db(username)
+    streaks = get_streaks(conn, username, datetime.now().strftime('%Y-%m-%d'))
+    conn.close()
+    return streaks
+
+def get_cohort_stats(username):
+    return _from_store(username, 'cohort', load_cohort_stats)
+
+def load_cohort_stats():
+    """Today's and this week's steps CDFs and this week's leaderboard."""
+    day_period, week_period = period_keys(datetime.now().strftime('%Y-%m-%d'))
     conn = get_db()
+    cohort = {
+        'day_cdf': get_cdf(conn, 'steps', day_period),
+        'week_cdf': get_cdf(conn, 'steps', week_period),
+        'leaderboard': get_leaderboard(conn, 'steps', week_period),
+    }
+    conn.close()
+    return cohort
+
+def get_progress_history(username, days=7):
+    """
+    Progress rows for the last `days` days, or all time if days is None.
+    Served from the session's prefetched data when it covers the range.
+    """
+    df = _recent_from_store(username, 'progress', 'date', days, load_progress_history)
+    if df is not None:
+        return df
+    return load_progress_history(username, days)
+
+def load_progress_history(username, days=7):
+    """
+    Progress rows for the last `days` days, or all time if days is None.
+    Rows that have been moved to the Parquet archive are merged back in.
+    """
+    conn = get_db(username)
     c = conn.cursor()
     
     # Get data for last n days
-    date_limit = (datetime.now() - timedelta(days=days-1)).strftime('%Y-%m-%d')
+    date_limit = None
+    if days is not None:
+        date_limit = (datetime.now() - timedelta(days=days-1)).strftime('%Y-%m-%d')
     c.execute("""
         SELECT date, steps, calories_burnt, calorie_intake, water_intake, sleep_time 
         FROM progress 
         WHERE username = ? AND date >= ?
         ORDER BY date ASC
-    """, (username, date_limit))
+    """, (username, date_limit or ''))
     
     history = c.fetchall()
     conn.close()
     
-    return pd.DataFrame(history, columns=['date', 'steps', 'calories_burnt', 
-                                        'calorie_intake', 'water_intake', 'sleep_time'])
+    df = pd.DataFrame(history, columns=['date', 'steps', 'calories_burnt', 
+                                    'calorie_intake', 'water_intake', 'sleep_time'])
+    return merge_with_archive('progress', username, df, since=date_limit)
+
+def get_mood_history(username, days=None):
+    """
+    Mental health check-ins for the last `days` days, or all time if days is None.
+    Served from the session's prefetched data when it covers the range.
+    """
+    df = _recent_from_store(username, 'mood', 'check_date', days, load_mood_history)
+    if df is not None:
+        return df
+    return load_mood_history(username, days)
+
+def load_mood_history(username, days=None):
+    """
+    Mental health check-ins for the last `days` days, or all time if days is None.
+    Rows that have been moved to the Parquet archive are merged back in.
+    """
+    conn = get_db(username)
+    c = conn.cursor()
+    
+    date_limit = None
+    if days is not None:
+        date_limit = (datetime.now() - timedelta(days=days-1)).strftime('%Y-%m-%d')
+    c.execute("""
+        SELECT check_date, mood_rating, notes 
+        FROM mental_health_checks 
+        WHERE username = ? AND check_date >= ?
+        ORDER BY check_date ASC
+    """, (username, date_limit or ''))
+    
+    history = c.fetchall()
+    conn.close()
+    
+    df = pd.DataFrame(history, columns=['check_date', 'mood_rating', 'notes'])
+    return merge_with_archive('mental_health_checks', username, df, since=date_limit)
 
 def login_page():
     st.title("🏃‍♂️ Fitness & Mental Health Tracker")
@@ -318,6 +468,7 @@ def show_login_page():
                 if success:
                     st.session_state.logged_in = True
                     st.session_state.username = username
+                    start_prefetch(username)
                     st.success(message)
                     st.rerun()
                 else:
@@ -381,77 +532,137 @@ def show_dashboard():
         st.session_state.logged_in = False
         st.session_state.username = ""
         st.session_state.show_signup = False
+        st.session_state.pop("user_store", None)
         st.rerun()
 
+def ordinal(value):
+    """1 -> '1st', 22 -> '22nd', 13 -> '13th'."""
+    n = int(round(value))
+    if 10 <= n % 100 <= 20:
+        suffix = 'th'
+    else:
+        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return f"{n}{suffix}"
+
 def show_dashboard_metrics():
+    username = st.session_state.username
+    store = get_session_store(username)
+    
+    # Lay out the page first; the sections fill in once the prefetch lands
     st.subheader("Today's Progress 📊")
+    metrics_area = st.empty()
+    streaks_area = st.empty()
+    st.subheader("Weekly Progress 📈")
+    cohort_area = st.empty()
+    charts_area = st.empty()
+    if store is not None and not store.is_ready():
+        metrics_area.caption("Loading your data…")
+        charts_area.caption("Loading your charts…")
+        store.wait()
     
     # Get goals and today's progress
-    goals = get_user_goals(st.session_state.username)
-    today = datetime.now().strftime('%Y-%m-%d')
+    goals = get_user_goals(username)
     
-    conn = get_db()
-    c = conn.cursor()
-    c.execute("""
-        SELECT steps, calories_burnt, calorie_intake, water_intake, sleep_time 
-        FROM progress 
-        WHERE username = ? AND date = ?
-    """, (st.session_state.username, today))
-    progress = c.fetchone()
+    # The week's rows also feed the charts below; today's row comes out of them
+    df = get_progress_history(username)
+    today_progress = df[df['date'] == datetime.now().strftime('%Y-%m-%d')]
+    progress = today_progress.iloc[0, 1:].tolist() if not today_progress.empty else None
     
     # Get today's mood rating
-    c.execute("""
-        SELECT mood_rating 
-        FROM mental_health_checks 
-        WHERE username = ? AND check_date = ?
-    """, (st.session_state.username, today))
-    mood = c.fetchone()
-    conn.close()
+    today_mood = get_mood_history(username, 1)
+    mood = (today_mood['mood_rating'].iloc[0],) if not today_mood.empty else None
     
     if not progress:
         progress = [0, 0, 0, 0, 0]
     
     # Create metrics
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.metric("Steps", f"{progress[0]:,}", 
-                 f"Goal: {goals['steps']:,}")
-        st.metric("Sleep (hours)", progress[4], 
-                 f"Goal: {goals['sleep_time']}")
-    
-    with col2:
-        st.metric("Calories Burnt", f"{progress[1]:,}", 
-                 f"Goal: {goals['calories_burnt']:,}")
-        st.metric("Water (ml)", f"{progress[3]:,}", 
-                 f"Goal: {goals['water_intake']:,}")
-    
-    with col3:
-        st.metric("Calories Intake", f"{progress[2]:,}", 
-                 f"Goal: {goals['calorie_intake']:,}")
-        st.metric("Today's Mood", f"{mood[0]}/10" if mood else "Not logged")
+    with metrics_area.container():
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            st.metric("Steps", f"{progress[0]:,}", 
+                     f"Goal: {goals['steps']:,}")
+            st.metric("Sleep (hours)", progress[4], 
+                     f"Goal: {goals['sleep_time']}")
+        
+        with col2:
+            st.metric("Calories Burnt", f"{progress[1]:,}", 
+                     f"Goal: {goals['calories_burnt']:,}")
+            st.metric("Water (ml)", f"{progress[3]:,}", 
+                     f"Goal: {goals['water_intake']:,}")
+        
+        with col3:
+            st.metric("Calories Intake", f"{progress[2]:,}", 
+                     f"Goal: {goals['calorie_intake']:,}")
+            st.metric("Today's Mood", f"{mood[0]}/10" if mood else "Not logged")
+    
+    # Show goal streaks
+    streaks = get_user_streaks(username)
+    
+    if streaks:
+        with streaks_area.container():
+            st.subheader("Goal Streaks 🔥")
+            labels = {'steps': "Steps", 'calories_burnt': "Calories Burnt",
+                      'calorie_intake': "Calories Intake", 'water_intake': "Water",
+                      'sleep_time': "Sleep"}
+            cols = st.columns(len(labels))
+            for col, (metric, label) in zip(cols, labels.items()):
+                streak = streaks.get(metric, {})
+                adherence = streak.get('month_adherence')
+                with col:
+                    st.metric(f"{label} streak", f"{streak.get('current_streak', 0)} days",
+                              f"Best: {streak.get('longest_streak', 0)}", delta_color="off")
+                    if adherence is not None:
+                        st.caption(f"{adherence:.0%} of logged days this month")
     
     # Show weekly progress charts
-    st.subheader("Weekly Progress 📈")
-    df = get_progress_history(st.session_state.username)
-    
-    if not df.empty:
-        # Steps progress
-        fig = px.line(df, x='date', y='steps', 
-                     title='Steps Progress',
-                     markers=True)
-        fig.add_hline(y=goals['steps'], line_dash="dash", 
-                     annotation_text="Goal")
-        st.plotly_chart(fig)
-        
-        # Calories chart
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=df['date'], y=df['calories_burnt'],
-                               name="Calories Burnt",mode='lines+markers'))
-        fig.add_trace(go.Scatter(x=df['date'], y=df['calorie_intake'],
-                               name="Calories Intake", mode='lines+markers'))
-        fig.update_layout(title='Calories Progress')
-        st.plotly_chart(fig)
+    # Show where the user stands, from the precomputed cohort sketches
+    week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime('%Y-%m-%d')
+    this_week = df[df['date'] >= week_start]
+    cohort = get_cohort_stats(username)
+    # Without a row for today there is nothing to rank, rather than a 0
+    steps_today = (percentile_from_cdf(cohort['day_cdf'], progress[0])
+                   if not today_progress.empty else None)
+    steps_week = (percentile_from_cdf(cohort['week_cdf'], this_week['steps'].mean())
+                  if not this_week.empty else None)
+    leaderboard = cohort['leaderboard']
+    
+    if steps_today is not None or steps_week is not None:
+        with cohort_area.container():
+            if steps_today is not None:
+                st.caption(f"🏆 Your steps today are in the {ordinal(steps_today)} percentile")
+            if steps_week is not None:
+                st.caption(f"🏆 Your steps this week are in the {ordinal(steps_week)} percentile")
+            if leaderboard:
+                with st.expander("This week's steps leaderboard"):
+                    st.dataframe(pd.DataFrame(leaderboard, columns=['Rank', 'User', 'Avg Steps']),
+                                 hide_index=True)
+    
+    if df.empty:
+        charts_area.empty()
+    else:
+        with charts_area.container():
+            # Steps progress
+            fig = px.line(df, x='date', y='steps', 
+                         title='Steps Progress',
+                         markers=True)
+            fig.add_hline(y=goals['steps'], line_dash="dash", 
+                         annotation_text="Goal")
+            st.plotly_chart(fig)
+            
+            # Calories chart
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(x=df['date'], y=df['calories_burnt'],
+                                   name="Calories Burnt",mode='lines+markers'))
+            fig.add_trace(go.Scatter(x=df['date'], y=df['calorie_intake'],
+                                   name="Calories Intake", mode='lines+markers'))
+            fig.update_layout(title='Calories Progress')
+            st.plotly_chart(fig)
+
+def _input_bounds(fields, name):
+    """min_value/max_value for a number_input, from the ranges the ingest API also enforces."""
+    _, low, high = fields[name]
+    return {'min_value': low, 'max_value': high}
 
 def show_progress_logging():
     st.subheader("Log Today's Progress 📝")
@@ -459,15 +670,19 @@ def show_progress_logging():
     goals = get_user_goals(st.session_state.username)
     
     with st.form("progress_form"):
-        steps = st.number_input("Steps", min_value=0, max_value=100000, 
+        steps = st.number_input("Steps", **_input_bounds(PROGRESS_FIELDS, 'steps'),
                               help=f"Daily goal: {goals['steps']}")
-        calories_burnt = st.number_input("Calories Burnt", min_value=0,
+        calories_burnt = st.number_input("Calories Burnt",
+                                       **_input_bounds(PROGRESS_FIELDS, 'calories_burnt'),
                                        help=f"Daily goal: {goals['calories_burnt']}")
-        calorie_intake = st.number_input("Calorie Intake", min_value=0,
+        calorie_intake = st.number_input("Calorie Intake",
+                                       **_input_bounds(PROGRESS_FIELDS, 'calorie_intake'),
                                        help=f"Daily goal: {goals['calorie_intake']}")
-        water_intake = st.number_input("Water Intake (ml)", min_value=0,
+        water_intake = st.number_input("Water Intake (ml)",
+                                     **_input_bounds(PROGRESS_FIELDS, 'water_intake'),
                                      help=f"Daily goal: {goals['water_intake']}")
-        sleep_time = st.number_input("Sleep (hours)", min_value=0.0, max_value=24.0,
+        sleep_time = st.number_input("Sleep (hours)",
+                                   **_input_bounds(PROGRESS_FIELDS, 'sleep_time'),
                                    help=f"Daily goal: {goals['sleep_time']}")
         
         if st.form_submit_button("Save Progress"):
@@ -487,20 +702,22 @@ def show_goals_section():
     current_goals = get_user_goals(st.session_state.username)
     
     with st.form("goals_form"):
-        steps = st.number_input("Daily Steps Goal", min_value=1000, max_value=100000,
+        steps = st.number_input("Daily Steps Goal", **_input_bounds(GOAL_FIELDS, 'steps'),
                               value=current_goals['steps'])
-        calories_burnt = st.number_input("Daily Calories Burnt Goal", min_value=500,
+        calories_burnt = st.number_input("Daily Calories Burnt Goal",
+                                       **_input_bounds(GOAL_FIELDS, 'calories_burnt'),
                                        value=current_goals['calories_burnt'])
-        calorie_intake = st.number_input("Daily Calorie Intake Goal", min_value=500,
+        calorie_intake = st.number_input("Daily Calorie Intake Goal",
+                                       **_input_bounds(GOAL_FIELDS, 'calorie_intake'),
                                        value=current_goals['calorie_intake'])
-        water_intake = st.number_input("Daily Water Intake Goal (ml)", min_value=500,
+        water_intake = st.number_input("Daily Water Intake Goal (ml)",
+                                     **_input_bounds(GOAL_FIELDS, 'water_intake'),
                                      value=current_goals['water_intake'])
-        sleep_time = st.number_input("Daily Sleep Goal (hours)", min_value=4.0,
-                                   max_value=12.0, value=current_goals['sleep_time'])
-        weight_goal = st.selectbox("Weight Goal",
-                                 ["Maintain Weight", "Lose Weight", "Gain Weight"],
-                                 index=["Maintain Weight", "Lose Weight", 
-                                       "Gain Weight"].index(current_goals['weight_goal']))
+        sleep_time = st.number_input("Daily Sleep Goal (hours)",
+                                   **_input_bounds(GOAL_FIELDS, 'sleep_time'),
+                                   value=current_goals['sleep_time'])
+        weight_goal = st.selectbox("Weight Goal", WEIGHT_GOALS,
+                                 index=WEIGHT_GOALS.index(current_goals['weight_goal']))
         
         if st.form_submit_button("Update Goals"):
             goals_dict = {
@@ -520,25 +737,17 @@ def show_history_section():
     # Date range selection
     col1, col2 = st.columns(2)
     with col1:
-        days = st.selectbox("Time Period", [7, 14, 30, 90], index=0)
+        days = st.selectbox("Time Period", [7, 14, 30, 90, None], index=0,
+                            format_func=lambda d: "All time" if d is None else d)
     
     # Get fitness progress
     df_fitness = get_progress_history(st.session_state.username, days)
     
     # Get mental health progress
-    conn = get_db()
-    c = conn.cursor()
-    date_limit = (datetime.now() - timedelta(days=days-1)).strftime('%Y-%m-%d')
-    c.execute("""
-        SELECT check_date, mood_rating, notes 
-        FROM mental_health_checks 
-        WHERE username = ? AND check_date >= ?
-        ORDER BY check_date ASC
-    """, (st.session_state.username, date_limit))
-    mental_health_data = c.fetchall()
-    conn.close()
+    mental_health_data = get_mood_history(st.session_state.username, days)
     
-    tab1, tab2 = st.tabs(["Fitness Progress", "Mental Health Progress"])
+    tab1, tab2, tab3 = st.tabs(["Fitness Progress", "Mental Health Progress",
+                                "Mood vs Activity"])
     
     with tab1:
         if not df_fitness.empty:
@@ -559,9 +768,9 @@ def show_history_section():
             st.info("No fitness progress data available for the selected period.")
     
     with tab2:
-        if mental_health_data:
-            df_mental = pd.DataFrame(mental_health_data, 
-                                   columns=['Date', 'Mood Rating', 'Notes'])
+        if not mental_health_data.empty:
+            df_mental = mental_health_data.copy()
+            df_mental.columns = ['Date', 'Mood Rating', 'Notes']
             
             # Show mood trend
             fig = px.line(df_mental, x='Date', y='Mood Rating',
@@ -582,6 +791,46 @@ def show_history_section():
             )
         else:
             st.info("No mental health data available for the selected period.")
+    
+    with tab3:
+        show_mood_activity_analysis(st.session_state.username, days)
+
+def show_mood_activity_analysis(username, days):
+    """
+    Relate mood check-ins to activity over the user's full history
+    """
+    conn = get_db(username)
+    correlations = get_user_correlations(conn, username)
+    df = rolling_frame(conn, username, days=days)
+    conn.close()
+    
+    correlations = correlations.dropna(subset=['correlation'])
+    if correlations.empty:
+        st.info("Log progress and mood on a few of the same days to see how they relate.")
+        return
+    
+    labels = {'steps': "Steps", 'calories_burnt': "Calories Burnt",
+              'calorie_intake': "Calories Intake", 'water_intake': "Water",
+              'sleep_time': "Sleep"}
+    correlations['Activity'] = correlations['metric'].map(labels)
+    correlations['Compared with'] = correlations['lag'].map({0: "Same-day mood",
+                                                             1: "Next-day mood"})
+    fig = px.bar(correlations, x='Activity', y='correlation', color='Compared with',
+                 barmode='group', range_y=[-1, 1],
+                 title='How your activity relates to your mood (all time)')
+    st.plotly_chart(fig)
+    
+    # Rolling 7-day trends for the selected period
+    metric = st.selectbox("Compare mood with", list(labels), format_func=labels.get)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=df['date'], y=df['mood_rolling'],
+                           name="Mood (7-day avg)", mode='lines'))
+    fig.add_trace(go.Scatter(x=df['date'], y=df[f"{metric}_rolling"],
+                           name=f"{labels[metric]} (7-day avg)", mode='lines', yaxis='y2'))
+    fig.update_layout(title='7-Day Rolling Averages',
+                      yaxis=dict(title="Mood"),
+                      yaxis2=dict(title=labels[metric], overlaying='y', side='right'))
+    st.plotly_chart(fig)
 
 def init_db():
     try:
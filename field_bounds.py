@@ -0,0 +1,27 @@
+"""
+Allowed ranges for user-entered progress, goal and mood values.
+
+Shared by the Streamlit forms in demo.py and the ingest API's validators, so
+a value accepted by one is accepted by the other. Each field maps to
+(type, minimum, maximum); None means unbounded.
+"""
+
+PROGRESS_FIELDS = {
+    'steps': (int, 0, 100000),
+    'calories_burnt': (int, 0, None),
+    'calorie_intake': (int, 0, None),
+    'water_intake': (int, 0, None),
+    'sleep_time': (float, 0.0, 24.0),
+}
+
+GOAL_FIELDS = {
+    'steps': (int, 1000, 100000),
+    'calories_burnt': (int, 500, None),
+    'calorie_intake': (int, 500, None),
+    'water_intake': (int, 500, None),
+    'sleep_time': (float, 4.0, 12.0),
+}
+
+MOOD_RATING = (int, 1, 10)
+
+WEIGHT_GOALS = ["Maintain Weight", "Lose Weight", "Gain Weight"]
@@ -0,0 +1,496 @@
+"""
+Standalone asyncio HTTP ingestion service for progress, mood and goal updates.
+
+Runs outside the Streamlit process so devices and integrations can post data
+without going through the UI forms:
+
+    python ingest_api.py --port 8502
+
+Each endpoint accepts a JSON-lines body (one record per line):
+
+    POST /v1/progress  {"username": ..., "date": "YYYY-MM-DD", "steps": ..., ...}
+    POST /v1/mood      {"username": ..., "check_date": "YYYY-MM-DD", "mood_rating": ..., "notes": ...}
+    POST /v1/goals     {"username": ..., "steps": ..., ..., "weight_goal": ...}
+    GET  /v1/stats     ingest counters and rows/sec over the last minute
+"""
+import argparse
+import asyncio
+import json
+import math
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime
+
+import shards
+from field_bounds import GOAL_FIELDS, MOOD_RATING, PROGRESS_FIELDS, WEIGHT_GOALS
+from streaks import record_goal_change, record_progress
+
+DB_PATH = "fitness_tracker.db"
+
+MAX_BODY_BYTES = 4 * 1024 * 1024
+MAX_BATCH_LINES = 5000
+# Longest a client may leave a connection silent, between or within requests
+IDLE_TIMEOUT_SECONDS = 30.0
+
+# SQLite INTEGER is a signed 64-bit value
+SQLITE_INT_MIN, SQLITE_INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class ValidationError(ValueError):
+    pass
+
+
+def get_db(username=None, db_path=DB_PATH):
+    return shards.connect(username, db_path)
+
+
+def _check_number(record, field, kind, low, high):
+    if field not in record:
+        raise ValidationError(f"missing field '{field}'")
+    value = record[field]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValidationError(f"'{field}' must be a number")
+    # json.loads accepts NaN, Infinity and overflowing literals like 1e400
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValidationError(f"'{field}' must be a finite number")
+    if kind is int:
+        if value != int(value):
+            raise ValidationError(f"'{field}' must be an integer")
+        value = int(value)
+        if not SQLITE_INT_MIN <= value <= SQLITE_INT_MAX:
+            raise ValidationError(f"'{field}' is out of range")
+    else:
+        value = float(value)
+    if low is not None and value < low:
+        raise ValidationError(f"'{field}' must be >= {low}")
+    if high is not None and value > high:
+        raise ValidationError(f"'{field}' must be <= {high}")
+    return value
+
+
+def _check_username(record):
+    username = record.get('username')
+    if not isinstance(username, str) or not username:
+        raise ValidationError("missing field 'username'")
+    return username
+
+
+def _check_date(record, field):
+    """Return the record's date, defaulting to today like the Streamlit forms."""
+    value = record.get(field)
+    if value is None:
+        return datetime.now().strftime('%Y-%m-%d')
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValidationError(f"'{field}' must be a YYYY-MM-DD date")
+
+
+def validate_progress(record):
+    row = {'username': _check_username(record), 'date': _check_date(record, 'date')}
+    for field, (kind, low, high) in PROGRESS_FIELDS.items():
+        row[field] = _check_number(record, field, kind, low, high)
+    return row
+
+
+def validate_mood(record):
+    row = {
+        'username': _check_username(record),
+        'check_date': _check_date(record, 'check_date'),
+        'mood_rating': _check_number(record, 'mood_rating', *MOOD_RATING),
+    }
+    notes = record.get('notes', "")
+    if not isinstance(notes, str):
+        raise ValidationError("'notes' must be a string")
+    row['notes'] = notes
+    return row
+
+
+def validate_goals(record):
+    row = {'username': _check_username(record)}
+    for field, (kind, low, high) in GOAL_FIELDS.items():
+        row[field] = _check_number(record, field, kind, low, high)
+    if record.get('weight_goal') not in WEIGHT_GOALS:
+        raise ValidationError(f"'weight_goal' must be one of {WEIGHT_GOALS}")
+    row['weight_goal'] = record['weight_goal']
+    return row
+
+
+def write_progress(conn, rows):
+    # Date order keeps streak updates on the incremental fast path
+    rows = sorted(rows, key=lambda r: (r['username'], r['date']))
+    conn.executemany("""
+        INSERT OR REPLACE INTO progress
+        (username, date, steps, calories_burnt, calorie_intake, water_intake, sleep_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [(r['username'], r['date'], r['steps'], r['calories_burnt'],
+           r['calorie_intake'], r['water_intake'], r['sleep_time']) for r in rows])
+    for r in rows:
+        record_progress(conn, r['username'], r['date'], r)
+
+
+def write_mood(conn, rows):
+    conn.executemany("""
+        INSERT OR REPLACE INTO mental_health_checks
+        (username, check_date, mood_rating, notes)
+        VALUES (?, ?, ?, ?)
+    """, [(r['username'], r['check_date'], r['mood_rating'], r['notes']) for r in rows])
+
+
+def write_goals(conn, rows):
+    for r in rows:
+        record_goal_change(conn, r['username'], r)
+    conn.executemany("""
+        UPDATE goals
+        SET steps = ?, calories_burnt = ?, calorie_intake = ?,
+            water_intake = ?, sleep_time = ?, weight_goal = ?
+        WHERE username = ?
+    """, [(r['steps'], r['calories_burnt'], r['calorie_intake'], r['water_intake'],
+           r['sleep_time'], r['weight_goal'], r['username']) for r in rows])
+
+
+ENDPOINTS = {
+    '/v1/progress': (validate_progress, write_progress),
+    '/v1/mood': (validate_mood, write_mood),
+    '/v1/goals': (validate_goals, write_goals),
+}
+
+
+def parse_batch(body, validator):
+    """
+    Split a JSON-lines body into valid rows and per-line errors.
+
+    Rows come back as (line number, row) pairs, so errors found when the
+    rows are written can still point at their line.
+    """
+    rows, errors = [], []
+    lines = body.decode('utf-8').splitlines()
+    if len(lines) > MAX_BATCH_LINES:
+        raise ValidationError(f"batch exceeds {MAX_BATCH_LINES} lines")
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValidationError("record must be a JSON object")
+            rows.append((line_no, validator(record)))
+        except (ValueError, ValidationError) as e:
+            errors.append({'line': line_no, 'error': str(e)})
+    return rows, errors
+
+
+class IngestStats:
+    """Running ingest counters with a one-minute rows/sec window."""
+
+    def __init__(self, window=60.0):
+        self.window = window
+        self.started = time.monotonic()
+        self.accepted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.throttled = 0
+        self._recent = deque()
+
+    def record(self, accepted, rejected):
+        now = time.monotonic()
+        self.accepted += accepted
+        self.rejected += rejected
+        self.batches += 1
+        self._recent.append((now, accepted))
+        self._trim(now)
+
+    def _trim(self, now):
+        while self._recent and now - self._recent[0][0] > self.window:
+            self._recent.popleft()
+
+    def snapshot(self, queue_depth):
+        now = time.monotonic()
+        self._trim(now)
+        uptime = now - self.started
+        span = min(self.window, uptime) or 1.0
+        return {
+            'uptime_seconds': round(uptime, 1),
+            'batches': self.batches,
+            'rows_accepted': self.accepted,
+            'rows_rejected': self.rejected,
+            'batches_throttled': self.throttled,
+            'rows_per_sec_1m': round(sum(n for _, n in self._recent) / span, 2),
+            'rows_per_sec_total': round(self.accepted / (uptime or 1.0), 2),
+            'queue_depth': queue_depth,
+        }
+
+
+class IngestServer:
+    """
+    Accept JSON-lines batches over HTTP and hand them to writer tasks.
+
+    Each batch is split by shard on arrival and each shard has its own
+    queue drained by a single writer task. Shards are written in parallel,
+    while writes to one shard commit in arrival order, so the last write to
+    a (username, date) wins. The bounded queues are the backpressure point:
+    when a writer falls behind, new batches get a 503 with Retry-After
+    instead of piling up in memory or contending for SQLite write locks.
+    """
+
+    def __init__(self, db_path=DB_PATH, queue_size=64, enqueue_timeout=2.0,
+                 idle_timeout=IDLE_TIMEOUT_SECONDS):
+        self.db_path = db_path
+        self.queues = [asyncio.Queue(maxsize=queue_size) for _ in range(shards.shard_count())]
+        self.enqueue_timeout = enqueue_timeout
+        self.idle_timeout = idle_timeout
+        self.stats = IngestStats()
+
+    def ensure_schema(self):
+        """Create mental_health_checks if demo.py has not run against this file yet."""
+        conn = get_db(db_path=self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS mental_health_checks (
+                username TEXT,
+                check_date TEXT,
+                mood_rating INTEGER,
+                notes TEXT,
+                PRIMARY KEY (username, check_date),
+                FOREIGN KEY (username) REFERENCES users(username)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    async def serve(self, host, port):
+        self.ensure_schema()
+        writer_tasks = [asyncio.create_task(self._writer(queue)) for queue in self.queues]
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"Ingest API listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in writer_tasks:
+                task.cancel()
+
+    def _known_users(self, usernames):
+        conn = get_db(db_path=self.db_path)
+        try:
+            usernames = list(usernames)
+            known = set()
+            for i in range(0, len(usernames), 500):
+                chunk = usernames[i:i + 500]
+                known.update(u for (u,) in conn.execute(
+                    f"SELECT username FROM users WHERE username IN ({', '.join('?' * len(chunk))})",
+                    chunk))
+            return known
+        finally:
+            conn.close()
+
+    def _write_batch(self, writer_fn, numbered_rows):
+        """Write one shard's rows; returns (line, username) for users that do not exist."""
+        known = self._known_users({r['username'] for _, r in numbered_rows})
+        shard_rows = [r for _, r in numbered_rows if r['username'] in known]
+        if shard_rows:
+            conn = get_db(shard_rows[0]['username'], self.db_path)
+            try:
+                with conn:
+                    writer_fn(conn, shard_rows)
+            finally:
+                conn.close()
+        return [(line_no, r['username']) for line_no, r in numbered_rows
+                if r['username'] not in known]
+
+    async def _writer(self, queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            writer_fn, rows, future = await queue.get()
+            try:
+                unknown = await loop.run_in_executor(None, self._write_batch, writer_fn, rows)
+                if not future.cancelled():
+                    future.set_result(unknown)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                queue.task_done()
+
+    async def _enqueue(self, writer_fn, rows):
+        """
+        Split rows by shard and queue each part, all at once or not at all.
+
+        Returns the futures for the parts; raises asyncio.TimeoutError if a
+        target queue stays full for enqueue_timeout.
+        """
+        by_shard = {}
+        for line_no, r in rows:
+            by_shard.setdefault(shards.shard_index(r['username']), []).append((line_no, r))
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.enqueue_timeout
+        while any(self.queues[index].full() for index in by_shard):
+            if loop.time() >= deadline:
+                raise asyncio.TimeoutError
+            await asyncio.sleep(0.01)
+        # No await between the puts, so a batch's parts keep their order on every shard
+        futures = []
+        for index, shard_rows in by_shard.items():
+            future = loop.create_future()
+            self.queues[index].put_nowait((writer_fn, shard_rows, future))
+            futures.append(future)
+        return futures
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload, extra = await self._dispatch(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self._send(writer, status, payload, extra, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        except _HTTPError as e:
+            self._send(writer, e.status, {'error': e.message}, {}, False)
+            await writer.drain()
+        except Exception as e:
+            self._send(writer, 500, {'error': f"internal error: {type(e).__name__}"}, {}, False)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _read(self, read):
+        try:
+            return await asyncio.wait_for(read, self.idle_timeout)
+        except asyncio.TimeoutError:
+            raise _HTTPError(408, "request timed out")
+
+    async def _read_request(self, reader):
+        """
+        Read one request, or return None once the client closes the connection
+        or leaves it idle between requests for idle_timeout.
+        """
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        except asyncio.TimeoutError:
+            return None
+        if not request_line:
+            return None
+        try:
+            method, path, _ = request_line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise _HTTPError(400, "malformed request line")
+        headers = {}
+        while True:
+            line = await self._read(reader.readline())
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        body = b''
+        if method == 'POST':
+            if 'content-length' not in headers:
+                raise _HTTPError(411, "Content-Length required")
+            try:
+                length = int(headers['content-length'])
+            except ValueError:
+                raise _HTTPError(400, "invalid Content-Length")
+            if length < 0:
+                raise _HTTPError(400, "invalid Content-Length")
+            if length > MAX_BODY_BYTES:
+                raise _HTTPError(413, f"body exceeds {MAX_BODY_BYTES} bytes")
+            # Read in chunks so the timeout bounds each stall, not the whole upload
+            chunks, received = [], 0
+            while received < length:
+                chunk = await self._read(reader.read(min(65536, length - received)))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b''.join(chunks), length)
+                chunks.append(chunk)
+                received += len(chunk)
+            body = b''.join(chunks)
+        return method, path, headers, body
+
+    async def _dispatch(self, method, path, body):
+        if method == 'GET' and path == '/v1/stats':
+            return 200, self.stats.snapshot(sum(q.qsize() for q in self.queues)), {}
+        if path not in ENDPOINTS:
+            return 404, {'error': "unknown endpoint"}, {}
+        if method != 'POST':
+            return 405, {'error': "use POST"}, {}
+
+        validator, writer_fn = ENDPOINTS[path]
+        try:
+            rows, errors = parse_batch(body, validator)
+        except (UnicodeDecodeError, ValidationError) as e:
+            return 400, {'error': str(e)}, {}
+
+        if rows:
+            try:
+                futures = await self._enqueue(writer_fn, rows)
+            except asyncio.TimeoutError:
+                self.stats.throttled += 1
+                return 503, {'error': "ingest queue full, retry later"}, {'Retry-After': '1'}
+            try:
+                unknown = [u for part in await asyncio.gather(*futures) for u in part]
+            except sqlite3.Error as e:
+                return 500, {'error': f"database error: {e}"}, {}
+            except Exception as e:
+                return 500, {'error': f"internal error: {type(e).__name__}"}, {}
+            errors.extend({'line': line_no, 'error': f"unknown user '{u}'"}
+                          for line_no, u in unknown)
+            errors.sort(key=lambda e: e['line'])
+        else:
+            unknown = []
+
+        accepted = len(rows) - len(unknown)
+        self.stats.record(accepted, len(errors))
+        return 200, {'accepted': accepted, 'rejected': len(errors), 'errors': errors}, {}
+
+    def _send(self, writer, status, payload, extra_headers, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json',
+            'Content-Length': str(len(body)),
+            'Connection': 'keep-alive' if keep_alive else 'close',
+        }
+        headers.update(extra_headers)
+        head = f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        head += ''.join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+        writer.write(head.encode('latin-1') + body)
+
+
+class _HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+_REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    408: 'Request Timeout', 411: 'Length Required', 413: 'Payload Too Large',
+    500: 'Internal Server Error', 503: 'Service Unavailable',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fitness tracker ingestion API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--queue-size", type=int, default=64,
+                        help="batches buffered per shard before clients get 503")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT_SECONDS,
+                        help="seconds a connection may stay silent before it is closed")
+    args = parser.parse_args()
+
+    server = IngestServer(args.db, queue_size=args.queue_size, idle_timeout=args.idle_timeout)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Mood vs activity analytics.
+
+Aligns a user's mood check-ins and progress metrics on a daily calendar and
+computes lagged correlations (e.g. sleep -> next-day mood) and rolling
+statistics with NumPy over the full history, archive included.
+
+Correlations are cached as sufficient statistics (n, sums, sums of squares
+and cross products) per user, metric and lag, keyed by a fingerprint of the
+user's rows, so a refresh only recomputes users whose data changed and
+population-wide figures are just sums over the cached rows:
+
+    python mood_analytics.py --chunk-size 500
+"""
+import argparse
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import shards
+from archive import merge_with_archive
+from streaks import METRICS
+
+DB_PATH = "fitness_tracker.db"
+
+# Activity on day t against mood on day t + lag
+LAGS = (0, 1)
+MIN_PAIRS = 3
+
+
+def ensure_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS mood_analytics_cache (
+            username TEXT PRIMARY KEY,
+            fingerprint TEXT,
+            updated_at TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS mood_correlation_stats (
+            username TEXT,
+            metric TEXT,
+            lag INTEGER,
+            n INTEGER,
+            sx REAL,
+            sy REAL,
+            sxx REAL,
+            syy REAL,
+            sxy REAL,
+            PRIMARY KEY (username, metric, lag)
+        )
+    ''')
+
+
+def align_user_series(conn, username, since=None):
+    """
+    Daily calendar of mood and activity for one user.
+
+    Returns (dates, mood, activity) where mood is a float array and activity
+    maps each metric to a float array, all NaN on days with no entry.
+    `since` is an optional YYYY-MM-DD lower bound on the rows read.
+    """
+    progress = pd.DataFrame(conn.execute(f"""
+        SELECT date, {', '.join(METRICS)} FROM progress WHERE username = ? AND date >= ?
+    """, (username, since or '')).fetchall(), columns=['date'] + list(METRICS))
+    progress = merge_with_archive('progress', username, progress, since=since)
+    mood = pd.DataFrame(conn.execute("""
+        SELECT check_date, mood_rating, notes FROM mental_health_checks
+        WHERE username = ? AND check_date >= ?
+    """, (username, since or '')).fetchall(), columns=['check_date', 'mood_rating', 'notes'])
+    mood = merge_with_archive('mental_health_checks', username, mood, since=since)
+
+    if progress.empty or mood.empty:
+        return np.array([], dtype='datetime64[D]'), np.array([]), {m: np.array([]) for m in METRICS}
+
+    progress_days = progress['date'].to_numpy(dtype=str).astype('datetime64[D]')
+    mood_days = mood['check_date'].to_numpy(dtype=str).astype('datetime64[D]')
+    start = min(progress_days.min(), mood_days.min())
+    end = max(progress_days.max(), mood_days.max())
+    dates = np.arange(start, end + 1)
+
+    def on_calendar(days, values):
+        series = np.full(len(dates), np.nan)
+        series[(days - start).astype(np.int64)] = values
+        return series
+
+    mood_series = on_calendar(mood_days, mood['mood_rating'].to_numpy(dtype=float))
+    activity = {m: on_calendar(progress_days, progress[m].to_numpy(dtype=float))
+                for m in METRICS}
+    return dates, mood_series, activity
+
+
+def _lag_pairs(x, y, lag):
+    if lag:
+        x, y = x[:-lag], y[lag:]
+    mask = np.isfinite(x) & np.isfinite(y)
+    return x[mask], y[mask]
+
+
+def sufficient_stats(x, y, lag):
+    """(n, sx, sy, sxx, syy, sxy) for the pairs x[t], y[t + lag]."""
+    x, y = _lag_pairs(x, y, lag)
+    return (len(x), float(x.sum()), float(y.sum()), float((x * x).sum()),
+            float((y * y).sum()), float((x * y).sum()))
+
+
+def correlation_from_stats(n, sx, sy, sxx, syy, sxy):
+    """Pearson r from sufficient statistics, or None with too few pairs or no variance."""
+    if n < MIN_PAIRS:
+        return None
+    cov = sxy - sx * sy / n
+    var_x = sxx - sx * sx / n
+    var_y = syy - sy * sy / n
+    if var_x <= 1e-12 or var_y <= 1e-12:
+        return None
+    return cov / np.sqrt(var_x * var_y)
+
+
+def rolling_mean(series, window=7):
+    """Trailing mean over `window` days, ignoring missing days."""
+    values = np.nan_to_num(series)
+    present = np.isfinite(series).astype(float)
+    kernel = np.ones(window)
+    sums = np.convolve(values, kernel)[:len(series)]
+    counts = np.convolve(present, kernel)[:len(series)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def rolling_frame(conn, username, window=7, days=None):
+    """
+    DataFrame of daily mood and activity with trailing rolling means, for charts.
+
+    With `days`, only the last `days` days are returned, and only they and the
+    `window - 1` days leading into them are read.
+    """
+    date_limit = since = None
+    if days is not None:
+        date_limit = (datetime.now() - timedelta(days=days-1)).strftime('%Y-%m-%d')
+        since = (datetime.now() - timedelta(days=days+window-2)).strftime('%Y-%m-%d')
+    dates, mood, activity = align_user_series(conn, username, since)
+    df = pd.DataFrame({'date': dates.astype(str), 'mood_rating': mood})
+    df['mood_rolling'] = rolling_mean(mood, window)
+    for metric, series in activity.items():
+        df[metric] = series
+        df[f"{metric}_rolling"] = rolling_mean(series, window)
+    if date_limit is not None:
+        df = df[df['date'] >= date_limit].reset_index(drop=True)
+    return df
+
+
+def _column_sums(columns, date_col):
+    # A plain and a date-weighted sum per column, so a value moving to
+    # another metric or to another day changes the fingerprint
+    return ', '.join(f"TOTAL({c}), TOTAL({c} * julianday({date_col}))" for c in columns)
+
+
+def _fingerprints(conn, usernames):
+    """Cheap per-user summary of progress and mood rows; changes whenever rows do."""
+    placeholders = ', '.join('?' * len(usernames))
+    progress = {u: rest for u, *rest in conn.execute(f"""
+        SELECT username, COUNT(*), MAX(date), {_column_sums(METRICS, 'date')}
+        FROM progress WHERE username IN ({placeholders}) GROUP BY username
+    """, usernames)}
+    mood = {u: rest for u, *rest in conn.execute(f"""
+        SELECT username, COUNT(*), MAX(check_date), {_column_sums(['mood_rating'], 'check_date')}
+        FROM mental_health_checks WHERE username IN ({placeholders}) GROUP BY username
+    """, usernames)}
+    return {u: repr((progress.get(u), mood.get(u))) for u in usernames}
+
+
+def refresh_users(conn, usernames):
+    """Recompute cached statistics for users whose rows changed. Returns how many were recomputed."""
+    ensure_schema(conn)
+    if not usernames:
+        return 0
+    fingerprints = _fingerprints(conn, usernames)
+    placeholders = ', '.join('?' * len(usernames))
+    cached = dict(conn.execute(f"""
+        SELECT username, fingerprint FROM mood_analytics_cache
+        WHERE username IN ({placeholders})
+    """, usernames).fetchall())
+
+    stale = [u for u in usernames if cached.get(u) != fingerprints[u]]
+    updated_at = datetime.now().isoformat(timespec='seconds')
+    for username in stale:
+        _, mood, activity = align_user_series(conn, username)
+        rows = [(username, metric, lag, *sufficient_stats(series, mood, lag))
+                for metric, series in activity.items() for lag in LAGS]
+        with conn:
+            conn.execute("DELETE FROM mood_correlation_stats WHERE username = ?", (username,))
+            conn.executemany("""
+                INSERT INTO mood_correlation_stats
+                (username, metric, lag, n, sx, sy, sxx, syy, sxy)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.execute("""
+                INSERT OR REPLACE INTO mood_analytics_cache (username, fingerprint, updated_at)
+                VALUES (?, ?, ?)
+            """, (username, fingerprints[username], updated_at))
+    return len(stale)
+
+
+def refresh_all(conn, chunk_size=500, db_path=DB_PATH):
+    """
+    Walk all users in chunks, recomputing only those with new or changed rows.
+
+    `conn` is the main database (users table); each chunk is split by shard.
+    """
+    recomputed = 0
+    cursor = conn.execute("SELECT username FROM users ORDER BY username")
+    while True:
+        chunk = [u for (u,) in cursor.fetchmany(chunk_size)]
+        if not chunk:
+            break
+        for usernames in shards.group_by_shard(chunk).values():
+            shard_conn = shards.connect(usernames[0], db_path)
+            recomputed += refresh_users(shard_conn, usernames)
+            shard_conn.close()
+    return recomputed
+
+
+def get_user_correlations(conn, username):
+    """Per-metric, per-lag correlations for one user, refreshing the cache if needed."""
+    refresh_users(conn, [username])
+    rows = conn.execute("""
+        SELECT metric, lag, n, sx, sy, sxx, syy, sxy FROM mood_correlation_stats
+        WHERE username = ? ORDER BY metric, lag
+    """, (username,)).fetchall()
+    return pd.DataFrame([(metric, lag, n, correlation_from_stats(n, *stats))
+                         for metric, lag, n, *stats in rows],
+                        columns=['metric', 'lag', 'pairs', 'correlation'])
+
+
+def get_population_correlations(conns):
+    """
+    Population-wide correlations from the cached per-user statistics.
+
+    `conns` are the shard connections to aggregate over. `pooled` treats all
+    users' pairs as one sample; `mean_user` averages each user's own
+    correlation, which is not skewed by differences between users.
+    """
+    pooled = {}
+    per_user = {}
+    for metric, lag, n, *stats in _all_stats(conns):
+        key = (metric, lag)
+        totals = pooled.setdefault(key, np.zeros(6))
+        totals += (n, *stats)
+        r = correlation_from_stats(n, *stats)
+        if r is not None:
+            per_user.setdefault(key, []).append(r)
+
+    rows = []
+    for (metric, lag), totals in sorted(pooled.items()):
+        user_rs = per_user.get((metric, lag), [])
+        rows.append((metric, lag, int(totals[0]), correlation_from_stats(int(totals[0]), *totals[1:]),
+                     float(np.mean(user_rs)) if user_rs else None, len(user_rs)))
+    return pd.DataFrame(rows, columns=['metric', 'lag', 'pairs', 'pooled', 'mean_user', 'users'])
+
+
+def _all_stats(conns):
+    for conn in conns:
+        ensure_schema(conn)
+        yield from conn.execute("""
+            SELECT metric, lag, n, sx, sy, sxx, syy, sxy FROM mood_correlation_stats
+        """)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh mood vs activity analytics")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(args.db)
+    recomputed = refresh_all(conn, args.chunk_size, args.db)
+    conn.close()
+    print(f"Recomputed {recomputed} users in {time.perf_counter() - started:.2f}s")
+    shard_conns = shards.all_connections(args.db)
+    print(get_population_correlations(shard_conns).to_string(index=False))
+    for shard_conn in shard_conns:
+        shard_conn.close()
+
+
+if __name__ == "__main__":
+    main()
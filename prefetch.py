@@ -0,0 +1,178 @@
+"""
+Per-session prefetch of a user's working set.
+
+After login a background thread loads the user's goals and recent progress
+and mood history into a SessionStore kept in st.session_state, so the
+dashboard and other sections render from memory instead of querying the
+database one section at a time. The store is bounded in bytes and evicts
+least recently used entries; writers invalidate the keys they change.
+
+Rows can also arrive from outside the session (the ingest API, another
+login), so entries older than `ttl` seconds are reloaded in the background
+while the old copy is still served. Entries from an earlier day, and keys
+a writer invalidated, read as misses until their reload lands.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+PREFETCH_DAYS = 90
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 60
+
+
+def _size_of(value):
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+class SessionStore:
+    """
+    Memory-bounded LRU store filled by a background prefetch thread.
+
+    get() waits (up to `timeout`) for an in-flight prefetch before reporting
+    a miss, except when called from the prefetch thread itself. Expired,
+    invalidated and missing keys are reloaded on a background thread with
+    the loader given to start(), so readers never pay for the full reload.
+    """
+
+    def __init__(self, username, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL_SECONDS):
+        self.username = username
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.load_seconds = None
+        self.error = None
+        self._items = OrderedDict()
+        self._sizes = {}
+        self._stored = {}
+        self._loaders = {}
+        self._generations = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        size = _size_of(value)
+        self._discard(key)
+        if size > self.max_bytes:
+            return
+        while self._items and sum(self._sizes.values()) + size > self.max_bytes:
+            self._discard(next(iter(self._items)))
+        self._items[key] = value
+        self._sizes[key] = size
+        self._stored[key] = (time.monotonic(), date.today())
+
+    def get(self, key, timeout=5.0):
+        """The stored value, possibly up to one reload stale, or None on a miss."""
+        if self._thread is not None and threading.current_thread() is not self._thread:
+            self._ready.wait(timeout)
+        with self._lock:
+            value = None
+            if key in self._items:
+                stored_at, stored_on = self._stored[key]
+                if stored_on != date.today():
+                    # Yesterday's window is missing today entirely; don't serve it
+                    self._discard(key)
+                else:
+                    self._items.move_to_end(key)
+                    value = self._items[key]
+                    if time.monotonic() - stored_at <= self.ttl:
+                        return value
+        self.refresh(key)
+        return value
+
+    def refresh(self, key):
+        """Reload `key` with its loader on a background thread, if one isn't already running."""
+        with self._lock:
+            loader = self._loaders.get(key)
+            if loader is None or key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                while True:
+                    generation = self._generations.get(key, 0)
+                    value = loader()
+                    with self._lock:
+                        # An invalidation during the load means it may predate a write
+                        if self._generations.get(key, 0) == generation:
+                            self._store(key, value)
+                            return
+            except Exception as e:
+                self.error = e
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f"refresh-{self.username}-{key}", daemon=True).start()
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=5.0):
+        """Block until the prefetch has finished (or `timeout` passes)."""
+        return self._ready.wait(timeout)
+
+    def invalidate(self, *keys):
+        """Drop keys after a write and reload them in the background."""
+        with self._lock:
+            for key in keys:
+                self._discard(key)
+                self._generations[key] = self._generations.get(key, 0) + 1
+        for key in keys:
+            self.refresh(key)
+
+    def _discard(self, key):
+        self._items.pop(key, None)
+        self._sizes.pop(key, None)
+        self._stored.pop(key, None)
+
+    def start(self, loaders):
+        """
+        Run each loader in a background thread and store its result.
+
+        `loaders` maps keys to zero-argument callables, kept for later
+        reloads. A failing loader just leaves its key empty, so readers fall
+        back to querying directly.
+        """
+        self._loaders = dict(loaders)
+
+        def run():
+            started = time.perf_counter()
+            for key, loader in loaders.items():
+                try:
+                    generation = self._generations.get(key, 0)
+                    value = loader()
+                    with self._lock:
+                        if self._generations.get(key, 0) == generation:
+                            self._store(key, value)
+                except Exception as e:
+                    self.error = e
+            self.load_seconds = time.perf_counter() - started
+            self._ready.set()
+
+        self._thread = threading.Thread(target=run, name=f"prefetch-{self.username}",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self._ready.is_set(),
+                'keys': list(self._items),
+                'bytes': sum(self._sizes.values()),
+                'max_bytes': self.max_bytes,
+                'load_seconds': self.load_seconds,
+            }
@@ -0,0 +1,282 @@
+"""
+Hash-sharded storage for per-user tables.
+
+The users table stays in fitness_tracker.db. Every other per-user table
+(goals, progress, mental_health_checks and the tables derived from them) is
+placed in one of N SQLite files chosen by a stable hash of the username, so
+writes for different users contend for different locks. With the default
+of one shard everything lives in fitness_tracker.db as before.
+
+The shard count is read from shards.json. Changing it is an offline
+operation; stop the app and ingest API first:
+
+    python shards.py status
+    python shards.py reshard --count 8
+    python shards.py report
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+DB_PATH = "fitness_tracker.db"
+SHARD_CONFIG = os.environ.get("FITNESS_SHARD_CONFIG", "shards.json")
+SHARD_DIR = os.environ.get("FITNESS_SHARD_DIR", "shards")
+
+# Tables keyed by username that move with their user
+USER_TABLES = [
+    'goals', 'progress', 'mental_health_checks',
+    'goal_history', 'goal_outcomes', 'streaks', 'adherence',
+    'mood_analytics_cache', 'mood_correlation_stats',
+]
+
+_config = None
+_initialized = set()
+
+
+def shard_count():
+    global _config
+    if _config is None:
+        try:
+            with open(SHARD_CONFIG) as f:
+                _config = json.load(f)
+        except FileNotFoundError:
+            _config = {'count': 1}
+    return _config['count']
+
+
+def _write_config(count, cleanup_from=None):
+    """Switch the shard count; `cleanup_from` records old copies still to be removed."""
+    global _config
+    config = {'count': count}
+    if cleanup_from is not None:
+        config['cleanup_from'] = cleanup_from
+    tmp_path = SHARD_CONFIG + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f)
+    os.replace(tmp_path, SHARD_CONFIG)
+    _config = config
+
+
+def shard_index(username, count=None):
+    """Stable shard number for a username (independent of PYTHONHASHSEED)."""
+    count = count or shard_count()
+    digest = hashlib.blake2b(username.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count
+
+
+def shard_paths(count=None, db_path=DB_PATH):
+    count = count or shard_count()
+    if count == 1:
+        return [db_path]
+    return [os.path.join(SHARD_DIR, f"shard-{i:03d}-of-{count:03d}.db") for i in range(count)]
+
+
+def _init_shard(path, db_path=DB_PATH):
+    """Create per-user tables in a shard file using the schema from the main database."""
+    if path == db_path:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    main = sqlite3.connect(db_path)
+    statements = [sql for (sql,) in main.execute(f"""
+        SELECT sql FROM sqlite_master
+        WHERE tbl_name IN ({', '.join('?' * len(USER_TABLES))}) AND sql IS NOT NULL
+        ORDER BY type DESC
+    """, USER_TABLES)]
+    main.close()
+
+    conn = sqlite3.connect(path)
+    for sql in statements:
+        sql = sql.replace("CREATE TABLE ", "CREATE TABLE IF NOT EXISTS ", 1)
+        sql = sql.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1)
+        conn.execute(sql.replace("IF NOT EXISTS IF NOT EXISTS", "IF NOT EXISTS"))
+    conn.commit()
+    conn.close()
+
+
+def _connect_path(path, db_path=DB_PATH):
+    if path not in _initialized:
+        _init_shard(path, db_path)
+        _initialized.add(path)
+    return sqlite3.connect(path)
+
+
+def connect(username=None, db_path=DB_PATH):
+    """
+    Connection for a user's rows, or the main database if no username is given.
+    """
+    if username is None:
+        return sqlite3.connect(db_path)
+    return _connect_path(shard_paths(db_path=db_path)[shard_index(username)], db_path)
+
+
+def all_connections(db_path=DB_PATH):
+    """One connection per shard, for jobs and reports that span all users."""
+    return [_connect_path(path, db_path) for path in shard_paths(db_path=db_path)]
+
+
+def group_by_shard(usernames):
+    groups = defaultdict(list)
+    for username in usernames:
+        groups[shard_index(username)].append(username)
+    return groups
+
+
+def fan_out(sql, params=(), db_path=DB_PATH):
+    """Run a read query on every shard and return all rows."""
+    rows = []
+    for conn in all_connections(db_path):
+        try:
+            rows.extend(conn.execute(sql, params).fetchall())
+        finally:
+            conn.close()
+    return rows
+
+
+def reshard(new_count, db_path=DB_PATH, batch_size=5000):
+    """
+    Move every user's rows into the layout for `new_count` shards.
+
+    Rows are copied into the new files first, then shards.json is switched
+    (noting the old count), then the old copies are removed and the note
+    cleared. An interrupted run can be repeated: before the switch it copies
+    again, after it the rerun finishes removing the old copies. Returns rows
+    copied per table.
+    """
+    old_count = shard_count()
+    pending = _config.get('cleanup_from')
+    if pending is not None:
+        _remove_old_copies(pending, old_count, db_path)
+    if new_count == old_count:
+        return {}
+    old_paths = shard_paths(old_count, db_path)
+    new_paths = shard_paths(new_count, db_path)
+    targets = [_connect_path(path, db_path) for path in new_paths]
+
+    copied = defaultdict(int)
+    for old_path in old_paths:
+        if not os.path.exists(old_path):
+            continue
+        source = sqlite3.connect(old_path)
+        tables = [t for (t,) in source.execute(
+            "SELECT name FROM sqlite_master WHERE type='table'") if t in USER_TABLES]
+        for table in tables:
+            for target in targets:
+                _ensure_table(source, target, table)
+            cursor = source.execute(f"SELECT * FROM {table}")
+            columns = [d[0] for d in cursor.description]
+            user_col = columns.index('username')
+            insert = (f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                      f"VALUES ({', '.join('?' * len(columns))})")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                buckets = defaultdict(list)
+                for row in rows:
+                    buckets[shard_index(row[user_col], new_count)].append(row)
+                for index, bucket in buckets.items():
+                    with targets[index]:
+                        targets[index].executemany(insert, bucket)
+                copied[table] += len(rows)
+        source.close()
+    for target in targets:
+        target.close()
+
+    _write_config(new_count, cleanup_from=old_count)
+    _remove_old_copies(old_count, new_count, db_path)
+    return dict(copied)
+
+
+def _remove_old_copies(old_count, new_count, db_path=DB_PATH):
+    """Drop the rows left in the `old_count` layout once `new_count` is live."""
+    old_paths = shard_paths(old_count, db_path)
+    new_paths = shard_paths(new_count, db_path)
+    for old_path in old_paths:
+        if old_path in new_paths:
+            continue
+        if old_path == db_path:
+            # Keep the main database and its schema; only drop the moved rows
+            conn = sqlite3.connect(db_path)
+            with conn:
+                for table in USER_TABLES:
+                    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                                    (table,)).fetchone():
+                        conn.execute(f"DELETE FROM {table}")
+            conn.close()
+        elif os.path.exists(old_path):
+            os.remove(old_path)
+    _initialized.difference_update(old_paths)
+    _write_config(new_count)
+
+
+def _ensure_table(source, target, table):
+    (sql,) = source.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?",
+                            (table,)).fetchone()
+    if not target.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                          (table,)).fetchone():
+        target.execute(sql)
+
+
+def status(db_path=DB_PATH):
+    """Users and progress rows per shard, to check balance."""
+    report = []
+    for path in shard_paths(db_path=db_path):
+        conn = _connect_path(path, db_path)
+        users = conn.execute("SELECT COUNT(*) FROM goals").fetchone()[0]
+        progress = conn.execute("SELECT COUNT(*) FROM progress").fetchone()[0]
+        conn.close()
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        report.append((path, users, progress, size))
+    return report
+
+
+def admin_report(days=7, db_path=DB_PATH):
+    """Cross-user activity summary for the last `days` days, fanned out over all shards."""
+    date_limit = (datetime.now() - timedelta(days=days-1)).strftime('%Y-%m-%d')
+    rows = fan_out("""
+        SELECT COUNT(DISTINCT username), COUNT(*), TOTAL(steps), TOTAL(sleep_time)
+        FROM progress WHERE date >= ?
+    """, (date_limit,), db_path)
+    active = sum(r[0] for r in rows)
+    entries = sum(r[1] for r in rows)
+    return {
+        'days': days,
+        'active_users': active,
+        'entries': entries,
+        'avg_steps': sum(r[2] for r in rows) / entries if entries else None,
+        'avg_sleep': sum(r[3] for r in rows) / entries if entries else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage sharded user storage")
+    parser.add_argument("--db", default=DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="show rows per shard")
+    reshard_parser = commands.add_parser("reshard", help="change the shard count")
+    reshard_parser.add_argument("--count", type=int, required=True)
+    report_parser = commands.add_parser("report", help="cross-user activity summary")
+    report_parser.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.command == "status":
+        print(f"{shard_count()} shard(s)")
+        for path, users, progress, size in status(args.db):
+            print(f"{path}: {users} users, {progress} progress rows, {size} bytes")
+    elif args.command == "reshard":
+        if args.count < 1:
+            parser.error("--count must be at least 1")
+        copied = reshard(args.count, args.db)
+        for table, count in copied.items():
+            print(f"{table}: moved {count} rows")
+        print(f"Now using {shard_count()} shard(s)")
+    else:
+        print(json.dumps(admin_report(args.days, args.db), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""
+Incremental streak and goal-adherence engine.
+
+Every progress write evaluates the day against the goal that was in effect on
+that date and updates, per user and metric:
+
+    goal_outcomes  whether each logged day met its goal
+    streaks        current/longest run of consecutive days meeting the goal
+    adherence      days logged / days met per month ("2026-10") and ISO week ("2026-W42")
+
+Goal changes are kept in goal_history so past days stay judged against the
+goal that applied at the time. recompute_user() rebuilds the same state from
+scratch with NumPy for backfill; `python streaks.py --verify` checks that the
+incremental and vectorized paths agree for every user, and test_streaks.py
+checks the same on generated write sequences.
+"""
+import argparse
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import shards
+from archive import merge_with_archive
+
+DB_PATH = "fitness_tracker.db"
+
+# Metric -> True if the goal is a minimum to reach, False if it is a limit
+METRICS = {
+    'steps': True,
+    'calories_burnt': True,
+    'calorie_intake': False,
+    'water_intake': True,
+    'sleep_time': True,
+}
+
+
+def ensure_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS goal_history (
+            username TEXT,
+            effective_date TEXT,
+            steps INTEGER,
+            calories_burnt INTEGER,
+            calorie_intake INTEGER,
+            water_intake INTEGER,
+            sleep_time REAL,
+            PRIMARY KEY (username, effective_date)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS goal_outcomes (
+            username TEXT,
+            date TEXT,
+            metric TEXT,
+            met INTEGER,
+            PRIMARY KEY (username, metric, date)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS streaks (
+            username TEXT,
+            metric TEXT,
+            current_streak INTEGER,
+            longest_streak INTEGER,
+            last_date TEXT,
+            streak_before_last INTEGER,
+            longest_before_last INTEGER,
+            PRIMARY KEY (username, metric)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS adherence (
+            username TEXT,
+            metric TEXT,
+            period TEXT,
+            days_logged INTEGER,
+            days_met INTEGER,
+            PRIMARY KEY (username, metric, period)
+        )
+    ''')
+
+
+def _periods(date):
+    day = datetime.strptime(date, '%Y-%m-%d')
+    year, week, _ = day.isocalendar()
+    return [date[:7], f"{year}-W{week:02d}"]
+
+
+def _previous_day(date):
+    return (datetime.strptime(date, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def _goal_met(metric, value, goal):
+    return value >= goal if METRICS[metric] else value <= goal
+
+
+def goal_for_date(conn, username, date):
+    """Goals in effect on `date`, falling back to the goals table if there is no history."""
+    row = conn.execute(f"""
+        SELECT {', '.join(METRICS)} FROM goal_history
+        WHERE username = ? AND effective_date <= ?
+        ORDER BY effective_date DESC LIMIT 1
+    """, (username, date)).fetchone()
+    if row is None:
+        row = conn.execute(f"SELECT {', '.join(METRICS)} FROM goals WHERE username = ?",
+                           (username,)).fetchone()
+    if row is None:
+        return None
+    return dict(zip(METRICS, row))
+
+
+def record_progress(conn, username, date, progress_dict):
+    """
+    Update outcomes, streaks and adherence for one progress write.
+
+    Call on the same connection as the progress INSERT, before committing.
+    """
+    ensure_schema(conn)
+    goals = goal_for_date(conn, username, date)
+    if goals is None:
+        return
+
+    for metric in METRICS:
+        met = int(_goal_met(metric, progress_dict[metric], goals[metric]))
+        previous = conn.execute("""
+            SELECT met FROM goal_outcomes WHERE username = ? AND metric = ? AND date = ?
+        """, (username, metric, date)).fetchone()
+        conn.execute("""
+            INSERT OR REPLACE INTO goal_outcomes (username, date, metric, met)
+            VALUES (?, ?, ?, ?)
+        """, (username, date, metric, met))
+
+        # Adherence: a rewrite of the same day only adjusts days_met
+        logged_delta = 0 if previous else 1
+        met_delta = met - (previous[0] if previous else 0)
+        for period in _periods(date):
+            conn.execute("""
+                INSERT INTO adherence (username, metric, period, days_logged, days_met)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (username, metric, period) DO UPDATE SET
+                    days_logged = days_logged + excluded.days_logged,
+                    days_met = days_met + excluded.days_met
+            """, (username, metric, period, logged_delta, met_delta))
+
+        _update_streak(conn, username, metric, date, met)
+
+
+def _update_streak(conn, username, metric, date, met):
+    state = conn.execute("""
+        SELECT current_streak, longest_streak, last_date, streak_before_last, longest_before_last
+        FROM streaks WHERE username = ? AND metric = ?
+    """, (username, metric)).fetchone()
+
+    if state is None:
+        run_before, longest_before = 0, 0
+    else:
+        current, longest, last_date, streak_before_last, longest_before_last = state
+        if date == last_date:
+            run_before, longest_before = streak_before_last, longest_before_last
+        elif date > last_date:
+            run_before = current if _previous_day(date) == last_date else 0
+            longest_before = longest
+        else:
+            # Backfilled day before the latest one: rebuild this metric from outcomes
+            _rebuild_streak(conn, username, metric)
+            return
+
+    current = run_before + 1 if met else 0
+    conn.execute("""
+        INSERT OR REPLACE INTO streaks
+        (username, metric, current_streak, longest_streak, last_date,
+         streak_before_last, longest_before_last)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (username, metric, current, max(longest_before, current), date,
+          run_before, longest_before))
+
+
+def _rebuild_streak(conn, username, metric):
+    """Replay stored outcomes for one metric in date order."""
+    rows = conn.execute("""
+        SELECT date, met FROM goal_outcomes WHERE username = ? AND metric = ?
+        ORDER BY date ASC
+    """, (username, metric)).fetchall()
+    current = longest = run_before = longest_before = 0
+    last_date = None
+    for date, met in rows:
+        run_before = current if last_date and _previous_day(date) == last_date else 0
+        longest_before = longest
+        current = run_before + 1 if met else 0
+        longest = max(longest, current)
+        last_date = date
+    conn.execute("""
+        INSERT OR REPLACE INTO streaks
+        (username, metric, current_streak, longest_streak, last_date,
+         streak_before_last, longest_before_last)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (username, metric, current, longest, last_date, run_before, longest_before))
+
+
+def record_goal_change(conn, username, goals_dict):
+    """
+    Record a goal update in goal_history and re-evaluate days from today on under the new goals.
+
+    Call on the same connection as the goals UPDATE, before it runs, so the
+    goals being replaced can seed the history for users who predate it.
+    """
+    ensure_schema(conn)
+    today = datetime.now().strftime('%Y-%m-%d')
+    has_history = conn.execute("SELECT 1 FROM goal_history WHERE username = ? LIMIT 1",
+                               (username,)).fetchone()
+    if not has_history:
+        old_goals = goal_for_date(conn, username, today)
+        if old_goals is not None:
+            conn.execute(f"""
+                INSERT INTO goal_history (username, effective_date, {', '.join(METRICS)})
+                VALUES (?, '', ?, ?, ?, ?, ?)
+            """, (username, *[old_goals[m] for m in METRICS]))
+
+    conn.execute(f"""
+        INSERT OR REPLACE INTO goal_history (username, effective_date, {', '.join(METRICS)})
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (username, today, *[goals_dict[m] for m in METRICS]))
+
+    # Today onwards is now judged by the new goals; days after today only
+    # exist if they were posted ahead through the ingest API
+    rows = conn.execute(f"""
+        SELECT date, {', '.join(METRICS)} FROM progress
+        WHERE username = ? AND date >= ? ORDER BY date
+    """, (username, today)).fetchall()
+    for date, *values in rows:
+        record_progress(conn, username, date, dict(zip(METRICS, values)))
+
+
+def get_streaks(conn, username, today=None):
+    """
+    Streak and adherence summary per metric for display.
+
+    A streak whose last logged day is before yesterday has been broken, so its
+    current value reads as 0.
+    """
+    ensure_schema(conn)
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    yesterday = _previous_day(today)
+    month, week = _periods(today)
+    summary = {}
+    for metric, current, longest, last_date in conn.execute("""
+        SELECT metric, current_streak, longest_streak, last_date
+        FROM streaks WHERE username = ?
+    """, (username,)):
+        summary[metric] = {
+            'current_streak': current if last_date >= yesterday else 0,
+            'longest_streak': longest,
+        }
+    for metric, period, days_logged, days_met in conn.execute("""
+        SELECT metric, period, days_logged, days_met FROM adherence
+        WHERE username = ? AND period IN (?, ?)
+    """, (username, month, week)):
+        key = 'month_adherence' if period == month else 'week_adherence'
+        summary.setdefault(metric, {})[key] = days_met / days_logged if days_logged else None
+    return summary
+
+
+def compute_user_state(conn, username):
+    """
+    Vectorized recompute of outcomes, streaks and adherence from raw history.
+
+    Reads progress (including archived rows) and goal_history, and returns
+    (outcomes, streaks, adherence) in the same shape as the stored tables
+    without writing anything.
+    """
+    ensure_schema(conn)
+    rows = conn.execute(f"""
+        SELECT date, {', '.join(METRICS)} FROM progress WHERE username = ? ORDER BY date
+    """, (username,)).fetchall()
+    progress = pd.DataFrame(rows, columns=['date'] + list(METRICS))
+    progress = merge_with_archive('progress', username, progress)
+    if progress.empty:
+        return [], [], []
+
+    history = conn.execute(f"""
+        SELECT effective_date, {', '.join(METRICS)} FROM goal_history
+        WHERE username = ? ORDER BY effective_date
+    """, (username,)).fetchall()
+    if not history:
+        current_goals = goal_for_date(conn, username, '')
+        if current_goals is None:
+            return [], [], []
+        history = [('',) + tuple(current_goals[m] for m in METRICS)]
+
+    dates = progress['date'].to_numpy(dtype=str)
+    days = dates.astype('datetime64[D]').astype(np.int64)
+    effective = np.array([h[0] for h in history])
+    goal_values = np.array([h[1:] for h in history], dtype=float)
+    # Index of the goal row in effect on each date (dates before any history use the first row)
+    goal_idx = np.maximum(np.searchsorted(effective, dates, side='right') - 1, 0)
+
+    contiguous = np.zeros(len(days), dtype=bool)
+    contiguous[1:] = np.diff(days) == 1
+    positions = np.arange(len(days))
+    periods = np.array([_periods(d) for d in dates])
+    period_keys, period_inverse = np.unique(periods.ravel(), return_inverse=True)
+
+    outcomes, streaks, adherence = [], [], []
+    for col, (metric, minimum) in enumerate(METRICS.items()):
+        values = progress[metric].to_numpy(dtype=float)
+        goals = goal_values[goal_idx, col]
+        met = values >= goals if minimum else values <= goals
+
+        # Run length of consecutive met days ending at each position
+        continues = met & contiguous & np.concatenate(([False], met[:-1]))
+        run_start = np.maximum.accumulate(np.where(continues, 0, positions))
+        runs = np.where(met, positions - run_start + 1, 0)
+
+        current = int(runs[-1])
+        run_before = int(runs[-2]) if len(runs) > 1 and contiguous[-1] else 0
+        longest_before = int(runs[:-1].max()) if len(runs) > 1 else 0
+        streaks.append((username, metric, current, int(runs.max()), str(dates[-1]),
+                        run_before, longest_before))
+
+        outcomes.extend((username, str(d), metric, int(m)) for d, m in zip(dates, met))
+
+        logged = np.bincount(period_inverse, minlength=len(period_keys))
+        met_counts = np.bincount(period_inverse, weights=np.repeat(met, 2),
+                                 minlength=len(period_keys))
+        adherence.extend((username, metric, str(p), int(n), int(k))
+                         for p, n, k in zip(period_keys, logged, met_counts))
+
+    return outcomes, streaks, adherence
+
+
+def recompute_user(conn, username):
+    """Replace a user's stored streak state with the vectorized recompute."""
+    outcomes, streaks, adherence = compute_user_state(conn, username)
+    for table in ('goal_outcomes', 'streaks', 'adherence'):
+        conn.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
+    conn.executemany("INSERT INTO goal_outcomes VALUES (?, ?, ?, ?)", outcomes)
+    conn.executemany("INSERT INTO streaks VALUES (?, ?, ?, ?, ?, ?, ?)", streaks)
+    conn.executemany("INSERT INTO adherence VALUES (?, ?, ?, ?, ?)", adherence)
+
+
+def verify_user(conn, username):
+    """Return a list of differences between stored (incremental) and recomputed state."""
+    outcomes, streaks, adherence = compute_user_state(conn, username)
+    expected = {
+        'goal_outcomes': (outcomes, "username, date, metric, met"),
+        'streaks': (streaks, "username, metric, current_streak, longest_streak, last_date, "
+                             "streak_before_last, longest_before_last"),
+        'adherence': (adherence, "username, metric, period, days_logged, days_met"),
+    }
+    differences = []
+    for table, (rows, columns) in expected.items():
+        stored = set(conn.execute(f"SELECT {columns} FROM {table} WHERE username = ?",
+                                  (username,)).fetchall())
+        rows = set(rows)
+        for row in sorted(rows - stored):
+            differences.append(f"{table}: missing {row}")
+        for row in sorted(stored - rows):
+            differences.append(f"{table}: unexpected {row}")
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill or verify streak state")
+    parser.add_argument("--db", default=DB_PATH)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--backfill", action="store_true",
+                       help="recompute stored state for every user")
+    group.add_argument("--verify", action="store_true",
+                       help="compare stored state with a full recompute")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    usernames = [u for (u,) in conn.execute("SELECT username FROM users")]
+    conn.close()
+    failed = False
+    for username in usernames:
+        conn = shards.connect(username, args.db)
+        ensure_schema(conn)
+        if args.backfill:
+            with conn:
+                recompute_user(conn, username)
+        else:
+            differences = verify_user(conn, username)
+            for line in differences:
+                print(f"{username}: {line}")
+            failed = failed or bool(differences)
+        conn.close()
+
+    if args.verify:
+        print("Streak state mismatch" if failed else f"Verified {len(usernames)} users")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+The --compare gate must flag real slowdowns of sub-millisecond models while
+letting trial-to-trial noise through.
+
+    python -m pytest test_benchmark_models.py
+"""
+import json
+import sys
+
+import pytest
+
+import benchmark_models
+from benchmark_models import best_of, compare
+
+
+def _trial(scale=1.0, jitter=0.0):
+    """One worker result shaped like benchmark_model(), for a ~0.15 ms model."""
+    return {
+        'model': 'CHD',
+        'type': 'SVC',
+        'load_seconds': 0.0003 * scale + jitter / 1000,
+        'single_ms': 0.14 * scale + jitter,
+        'single_p50_ms': 0.15 * scale + jitter,
+        'single_p95_ms': 0.19 * scale + jitter,
+        'single_p99_ms': 0.25 * scale + jitter,
+        'batches': {},
+        'throughput_rows_per_sec': 170000.0 / scale,
+        'rss_delta_mb': 0.0,
+        'model_alloc_mb': 0.1,
+    }
+
+
+def _baseline():
+    trials = [_trial(jitter=j) for j in (0.0, 0.004, 0.008)]
+    return {'models': {'CHD': best_of(trials)}}
+
+
+def test_noise_within_spread_passes():
+    noisy = best_of([_trial(jitter=0.01), _trial(jitter=0.02)])
+    assert compare({'CHD': noisy}, _baseline(), threshold=0.25) == []
+
+
+def test_two_times_slower_sub_millisecond_model_fails():
+    slower = best_of([_trial(scale=2.0)] * 3)
+    failures = compare({'CHD': slower}, _baseline(), threshold=0.25)
+    assert any(f.startswith("CHD.single_ms") for f in failures)
+    assert any(f.startswith("CHD.load_seconds") for f in failures)
+
+
+def test_baseline_without_spread_uses_absolute_floor():
+    base = {'models': {'CHD': _trial()}}
+    slower = best_of([_trial(scale=2.0)])
+    assert any(f.startswith("CHD.single_ms")
+               for f in compare({'CHD': slower}, base, threshold=0.25))
+
+
+def test_compare_command_exits_non_zero(tmp_path, monkeypatch):
+    baseline_path = tmp_path / "baseline.json"
+    baseline_path.write_text(json.dumps(_baseline()))
+    monkeypatch.setattr(benchmark_models, "run_isolated",
+                        lambda name, models_dir, repeats: _trial(scale=2.0))
+    monkeypatch.setattr(sys, "argv", ["benchmark_models.py", "--models", "CHD",
+                                      "--compare", str(baseline_path)])
+    with pytest.raises(SystemExit) as exit_info:
+        benchmark_models.main()
+    assert exit_info.value.code == 1
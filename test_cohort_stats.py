@@ -0,0 +1,41 @@
+"""
+Compacting the quantile sketch must keep its total weight equal to the
+number of values it has seen, whatever the level sizes.
+
+    python -m pytest test_cohort_stats.py
+"""
+import random
+
+from cohort_stats import QuantileSketch
+
+
+def _weight(sketch):
+    return sum(len(items) * 2 ** level for level, items in enumerate(sketch.levels))
+
+
+def test_updates_keep_total_weight():
+    random.seed(1)
+    sketch = QuantileSketch(k=25)
+    for i in range(10007):
+        sketch.update(i)
+        assert _weight(sketch) == sketch.count
+
+
+def test_merges_of_odd_sized_sketches_keep_total_weight():
+    random.seed(2)
+    merged = QuantileSketch(k=25)
+    for size in (1, 3, 77, 501, 999, 2001):
+        part = QuantileSketch(k=25)
+        for i in range(size):
+            part.update(random.random())
+        merged.merge(part)
+        assert _weight(merged) == merged.count
+
+
+def test_median_stays_close():
+    random.seed(3)
+    sketch = QuantileSketch(k=200)
+    for i in range(20001):
+        sketch.update(i)
+    median = next(value for value, fraction in sketch.cdf() if fraction >= 0.5)
+    assert abs(median - 10000) < 20001 * 0.02
@@ -0,0 +1,159 @@
+"""
+The incremental streak updates must leave the same state as the vectorized
+recompute, however the writes arrive.
+
+    python -m pytest test_streaks.py
+"""
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import streaks
+from streaks import METRICS, record_goal_change, record_progress, verify_user
+
+USERNAME = "alice"
+START = datetime(2026, 1, 1)
+
+DEFAULT_GOALS = {
+    'steps': 10000,
+    'calories_burnt': 2000,
+    'calorie_intake': 2000,
+    'water_intake': 2000,
+    'sleep_time': 8.0,
+}
+
+
+class _Clock(datetime):
+    """datetime whose now() can be moved, so goal changes land on chosen days."""
+    current = START
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    # Run in an empty directory so no Parquet archive is picked up
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(streaks, "datetime", _Clock)
+    _Clock.current = START
+
+    conn = sqlite3.connect(tmp_path / "fitness_tracker.db")
+    conn.execute('''
+        CREATE TABLE goals (
+            username TEXT PRIMARY KEY,
+            steps INTEGER DEFAULT 10000,
+            calories_burnt INTEGER DEFAULT 2000,
+            calorie_intake INTEGER DEFAULT 2000,
+            water_intake INTEGER DEFAULT 2000,
+            sleep_time REAL DEFAULT 8.0,
+            weight_goal TEXT DEFAULT 'Maintain Weight'
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE progress (
+            username TEXT,
+            date TEXT,
+            steps INTEGER DEFAULT 0,
+            calories_burnt INTEGER DEFAULT 0,
+            calorie_intake INTEGER DEFAULT 0,
+            water_intake INTEGER DEFAULT 0,
+            sleep_time REAL DEFAULT 0,
+            PRIMARY KEY (username, date)
+        )
+    ''')
+    conn.execute("INSERT INTO goals (username) VALUES (?)", (USERNAME,))
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def _day(offset):
+    return (START + timedelta(days=offset)).strftime('%Y-%m-%d')
+
+
+def _random_progress(rng, goals):
+    # Hover around each goal so both outcomes are common
+    return {metric: (round(rng.uniform(0.7, 1.3) * goal, 1) if metric == 'sleep_time'
+                     else int(rng.uniform(0.7, 1.3) * goal))
+            for metric, goal in goals.items()}
+
+
+def log_progress(conn, date, progress):
+    """Write one progress row the way demo.py and the ingest API do."""
+    conn.execute(f"""
+        INSERT OR REPLACE INTO progress (username, date, {', '.join(METRICS)})
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (USERNAME, date, *[progress[m] for m in METRICS]))
+    record_progress(conn, USERNAME, date, progress)
+    conn.commit()
+
+
+def change_goals(conn, date, goals):
+    _Clock.current = datetime.strptime(date, '%Y-%m-%d')
+    record_goal_change(conn, USERNAME, goals)
+    conn.execute(f"""
+        UPDATE goals SET {', '.join(f'{m} = ?' for m in METRICS)} WHERE username = ?
+    """, (*[goals[m] for m in METRICS], USERNAME))
+    conn.commit()
+
+
+def test_in_order_days_match_recompute(conn):
+    rng = random.Random(1)
+    for offset in range(30):
+        log_progress(conn, _day(offset), _random_progress(rng, DEFAULT_GOALS))
+    assert verify_user(conn, USERNAME) == []
+
+
+def test_out_of_order_backfill_matches_recompute(conn):
+    rng = random.Random(2)
+    offsets = list(range(60))
+    rng.shuffle(offsets)
+    for offset in offsets:
+        log_progress(conn, _day(offset), _random_progress(rng, DEFAULT_GOALS))
+    assert verify_user(conn, USERNAME) == []
+
+
+def test_same_day_rewrites_match_recompute(conn):
+    rng = random.Random(3)
+    for offset in range(20):
+        log_progress(conn, _day(offset), _random_progress(rng, DEFAULT_GOALS))
+    # Flip earlier days between met and missed, including the middle of a streak
+    for _ in range(40):
+        log_progress(conn, _day(rng.randrange(20)), _random_progress(rng, DEFAULT_GOALS))
+    assert verify_user(conn, USERNAME) == []
+
+
+def test_goal_changes_with_backfill_match_recompute(conn):
+    rng = random.Random(4)
+    goals = dict(DEFAULT_GOALS)
+    for offset in range(0, 90, 15):
+        log_progress(conn, _day(offset), _random_progress(rng, goals))
+        goals = {metric: (round(goal * rng.uniform(0.8, 1.2), 1) if metric == 'sleep_time'
+                          else int(goal * rng.uniform(0.8, 1.2)))
+                 for metric, goal in goals.items()}
+        change_goals(conn, _day(offset), goals)
+        # Backfill earlier days, which stay judged against the goals in force then
+        for back in rng.sample(range(offset + 1), min(5, offset + 1)):
+            log_progress(conn, _day(back), _random_progress(rng, goals))
+        log_progress(conn, _day(offset + rng.randrange(1, 15)), _random_progress(rng, goals))
+    assert verify_user(conn, USERNAME) == []
+
+
+def test_random_history_matches_recompute(conn):
+    rng = random.Random(5)
+    goals = dict(DEFAULT_GOALS)
+    today = 0
+    for _ in range(300):
+        roll = rng.random()
+        if roll < 0.05:
+            # The clock only moves forward; rows may already exist past it
+            today += rng.randrange(1, 10)
+            goals = _random_progress(rng, DEFAULT_GOALS)
+            change_goals(conn, _day(today), goals)
+        else:
+            log_progress(conn, _day(rng.randrange(120)), _random_progress(rng, goals))
+    assert verify_user(conn, USERNAME) == []